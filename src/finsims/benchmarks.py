@@ -0,0 +1,242 @@
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from bootstrap_sampling import bootstrap_batch, stationary_block_bootstrap
+from gbm import simulate_gbm
+from heston import heston_model_sim
+from jsonl_utils import save_dataset
+from mjd import simulate_merton_jump_diffusion
+from transformations import cosine_transform, log_return, reverse_log_returns
+from wavelet_transformations import wavelet_transform
+
+SIZES = {
+    "small": {"n": 1000, "M": 1_000},
+    "medium": {"n": 1000, "M": 100_000},
+    "production": {"n": 1000, "M": 1_000_000},
+}
+SAVE_FORMATS = ["diffusionts", "tsdiff", "npy", "npz", "sharded"]
+
+
+def _prices(n, M):
+    return simulate_gbm(0.1, 0.4, n, M, 1 / n, s0=100, rng=0)
+
+
+def _setup_case(case, n, M, tmp_dir):
+    """Returns (fn, args) for a case; the setup itself is not timed."""
+    dt = 1 / n
+    if case == "simulate_gbm":
+        return simulate_gbm, (0.1, 0.4, n, M, dt, 100)
+    if case == "simulate_merton_jump_diffusion":
+        return simulate_merton_jump_diffusion, (0.1, 0.1, 5, 0.05, 0.05, n, M, dt, 100)
+    if case == "heston_model_sim":
+        # compile the kernel outside of the timed call
+        heston_model_sim(100.0, 0.0625, -0.7, 3, 0.04, 0.6, 1.0, 2, 2, 0.02)
+        return heston_model_sim, (100.0, 0.0625, -0.7, 3, 0.04, 0.6, 1.0, n, M, 0.02)
+    if case == "stationary_block_bootstrap":
+        history = log_return(_prices(10 * n, 1))[:, 0]
+        return stationary_block_bootstrap, (history, n, 20, M)
+    if case == "bootstrap_batch":
+        # the same total number of paths over 8 histories, in this process since
+        # the case already runs in a daemonic pool worker
+        histories = log_return(_prices(10 * n, 8)).T
+        return bootstrap_batch, (list(histories), n, 20, M // 8)
+    if case == "wavelet_transform":
+        return wavelet_transform, (_prices(n, M), "db4")
+    if case == "cosine_transform":
+        return cosine_transform, (_prices(n, M),)
+    if case == "reverse_log_returns":
+        return reverse_log_returns, (log_return(_prices(n, M)), 100)
+    if case.startswith("save_dataset:"):
+        format_ = case.split(":", 1)[1]
+        return save_dataset, (os.path.join(tmp_dir, "bench"), _prices(n, M), format_)
+    raise ValueError(f"Unknown benchmark case: {case}")
+
+
+def _run_case(case, n, M, repeats):
+    # runs in a fresh process, so that ru_maxrss is the peak of this case alone
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        fn, args = _setup_case(case, n, M, tmp_dir)
+        wall_times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn(*args)
+            wall_times.append(time.perf_counter() - start)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    wall_time = min(wall_times)
+    return {
+        "wall_time": wall_time,
+        "peak_rss_mb": peak_rss / 2**20,
+        "paths_per_sec": M / wall_time,
+    }
+
+
+def all_cases():
+    cases = [
+        "simulate_gbm",
+        "simulate_merton_jump_diffusion",
+        "heston_model_sim",
+        "stationary_block_bootstrap",
+        "bootstrap_batch",
+        "wavelet_transform",
+        "cosine_transform",
+        "reverse_log_returns",
+    ]
+    return cases + [f"save_dataset:{format_}" for format_ in SAVE_FORMATS]
+
+
+def run_benchmarks(size, cases=None, repeats=3):
+    """
+    Runs each case in its own process at the given size.
+
+    Returns:
+        A history record with the wall time (best of repeats), peak RSS and
+        paths/sec of every case.
+    """
+    n, M = SIZES[size]["n"], SIZES[size]["M"]
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for case in cases or all_cases():
+        with context.Pool(1) as pool:
+            results[case] = pool.apply(_run_case, (case, n, M, repeats))
+        print(
+            f"{case:40s} {results[case]['wall_time']:10.4f}s "
+            f"{results[case]['peak_rss_mb']:10.1f}MB "
+            f"{results[case]['paths_per_sec']:14.1f} paths/s"
+        )
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "size": size,
+        "n": n,
+        "M": M,
+        "results": results,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(history_path):
+    try:
+        with open(history_path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def append_history(history_path, record):
+    history = load_history(history_path)
+    history.append(record)
+    with open(history_path, "w") as f:
+        json.dump(history, f, indent=4)
+
+
+def compare(record, baseline, tolerance=0.1):
+    """
+    Flags cases whose wall time grew by more than tolerance relative to the
+    baseline record.
+
+    Returns:
+        regressions: A dict mapping case names to their slowdown ratio.
+    """
+    regressions = {}
+    for case, result in record["results"].items():
+        if case not in baseline["results"]:
+            continue
+        ratio = result["wall_time"] / baseline["results"][case]["wall_time"]
+        status = "REGRESSION" if ratio > 1 + tolerance else "ok"
+        if ratio > 1 + tolerance:
+            regressions[case] = ratio
+        print(f"{case:40s} {ratio:8.2f}x  {status}")
+    return regressions
+
+
+def _latest(history, size):
+    records = [record for record in history if record["size"] == size]
+    if not records:
+        raise SystemExit(f"No {size} benchmark records found")
+    return records[-1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the simulators, transformations and dataset formats."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks.")
+    run_parser.add_argument("-s", "--size", choices=list(SIZES), default="small")
+    run_parser.add_argument(
+        "--cases", nargs="+", default=None, help="The cases to run (default: all)."
+    )
+    run_parser.add_argument("-r", "--repeats", type=int, default=3)
+    run_parser.add_argument(
+        "--history",
+        type=str,
+        default="benchmark_history.json",
+        help="The JSON file the results are appended to.",
+    )
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="Compare the latest run against a baseline."
+    )
+    compare_parser.add_argument("-s", "--size", choices=list(SIZES), default="small")
+    compare_parser.add_argument("--history", type=str, default="benchmark_history.json")
+    compare_parser.add_argument(
+        "--baseline",
+        type=str,
+        default="benchmark_baseline.json",
+        help="The JSON file holding the baseline record of each size.",
+    )
+    compare_parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="The relative slowdown tolerated before a case is flagged.",
+    )
+    compare_parser.add_argument(
+        "--save_baseline",
+        action="store_true",
+        help="Store the latest run as the new baseline instead of comparing.",
+    )
+    args = parser.parse_args()
+
+    if args.command == "run":
+        append_history(
+            args.history, run_benchmarks(args.size, args.cases, args.repeats)
+        )
+    else:
+        latest = _latest(load_history(args.history), args.size)
+        baselines = {record["size"]: record for record in load_history(args.baseline)}
+        if args.save_baseline:
+            baselines[args.size] = latest
+            with open(args.baseline, "w") as f:
+                json.dump(list(baselines.values()), f, indent=4)
+        elif args.size not in baselines:
+            raise SystemExit(f"No {args.size} baseline in {args.baseline}")
+        elif compare(latest, baselines[args.size], args.tolerance):
+            sys.exit(1)
@@ -1,33 +1,191 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
 import numpy as np
+from sweep_utils import spawn_seeds
+
+# Arrays of the running bootstrap_batch, attached once per worker process
+_shared = {}
 
 
 def stationary_block_bootstrap(
-    historical_data, number_required=200, exp_block_size=20, num_paths=1000
+    historical_data,
+    number_required=200,
+    exp_block_size=20,
+    num_paths=1000,
+    rng=None,
+    out=None,
 ):
-    N = len(historical_data)
-    all_bootstrap_samples = []
+    """
+    Stationary block bootstrap (Politis & Romano) of a 1D series.
+
+    Parameters:
+    - historical_data: 1D array-like series to resample.
+    - number_required: Length of each bootstrap path.
+    - exp_block_size: Expected block length (geometric distribution mean).
+    - num_paths: Number of bootstrap paths.
+    - rng: numpy Generator or seed (fresh default_rng if None).
+    - out: Optional preallocated array of shape (number_required, num_paths).
+
+    Returns:
+    - Bootstrap paths (array of shape (number_required, num_paths)).
+    """
+    historical_data = np.asarray(historical_data)
+    rng = np.random.default_rng(rng)
+    indices = _bootstrap_indices(
+        len(historical_data), number_required, exp_block_size, num_paths, rng
+    )
+    if out is None:
+        out = np.empty((number_required, num_paths), dtype=historical_data.dtype)
+    # mode="wrap" wraps indices exceeding the data length back to the beginning
+    np.take(historical_data, indices, mode="wrap", out=out)
+    return out
+
+
+def _bootstrap_indices(N, number_required, exp_block_size, num_paths, rng):
+    # Unwrapped indices into a series of length N, shape (number_required, num_paths)
+    if number_required == 0:
+        return np.empty((0, num_paths), dtype=np.int64)
+    p = 1 / exp_block_size
+
+    # Draw block starts and lengths in bulk; about twice the expected number of
+    # blocks is almost always enough, rows that fall short get topped up below
+    n_blocks = min(number_required, int(np.ceil(2 * number_required * p)) + 1)
+    lengths = rng.geometric(p, size=(num_paths, n_blocks))
+    starts = rng.integers(0, N, size=(num_paths, n_blocks))
+    ends = lengths.cumsum(axis=1)
+    while (ends[:, -1] < number_required).any():
+        extra_lengths = rng.geometric(p, size=(num_paths, n_blocks))
+        extra_starts = rng.integers(0, N, size=(num_paths, n_blocks))
+        lengths = np.hstack([lengths, extra_lengths])
+        starts = np.hstack([starts, extra_starts])
+        ends = lengths.cumsum(axis=1)
+
+    # Clip blocks to the path length so that every row covers exactly
+    # number_required samples
+    block_offsets = ends - lengths
+    np.minimum(ends, number_required, out=ends)
+    lengths = np.clip(ends - block_offsets, 0, None)
 
-    for _ in range(num_paths):
-        bootstrap_samples = []
+    # Expand to one index per sample: block start plus position within the block
+    lengths = lengths.ravel()
+    positions = np.tile(np.arange(number_required), num_paths)
+    indices = np.repeat(starts.ravel() - block_offsets.ravel(), lengths) + positions
+    return indices.reshape(num_paths, number_required).T
+
+
+def _attach(history_name, history_shape, out_name, out_shape, dtype):
+    history_shm = SharedMemory(name=history_name)
+    out_shm = SharedMemory(name=out_name)
+    _shared["handles"] = (history_shm, out_shm)
+    _shared["history"] = np.ndarray(history_shape, dtype, buffer=history_shm.buf)
+    _shared["out"] = np.ndarray(out_shape, dtype, buffer=out_shm.buf)
+
+
+def _bootstrap_task(offset, length, column, stride, width, exp_block_size, seed):
+    # Resamples history[:, offset:offset + length] into the output columns
+    # column + a * stride + [0, width) of every history row a, all rows
+    # sharing the same block indices
+    history, out = _shared["history"], _shared["out"]
+    rng = np.random.default_rng(seed)
+    indices = _bootstrap_indices(length, out.shape[0], exp_block_size, width, rng)
+    for a in range(history.shape[0]):
+        start = column + a * stride
+        # np.take into a strided out is very slow, gather contiguously first
+        out[:, start : start + width] = np.take(
+            history[a, offset : offset + length], indices, mode="wrap"
+        )
+
+
+def bootstrap_batch(
+    histories,
+    number_required=200,
+    exp_block_size=20,
+    num_paths=1000,
+    seed=None,
+    workers=1,
+    paths_per_task=10000,
+):
+    """
+    Stationary block bootstrap of many series at once.
 
-        while len(bootstrap_samples) < number_required:
-            # Choose a random starting index between 0 and N-1
-            index = np.random.randint(0, N)
+    The histories are copied once into shared memory and the paths are
+    generated in tasks of at most paths_per_task paths on a process pool,
+    writing straight into a shared output array. Every task has its own child
+    seed, so the result depends on seed and paths_per_task but not on workers.
 
-            # Sample block size from a geometric distribution
-            blocksize = np.random.geometric(1 / exp_block_size)
+    Parameters:
+    - histories: A list of 1D series (lengths may differ), each resampled
+      independently, or a 2D array (time, assets) of a multi-asset history
+      whose assets are resampled with the same block indices, preserving the
+      cross-asset correlation.
+    - number_required: Length of each bootstrap path.
+    - exp_block_size: Expected block length (geometric distribution mean).
+    - num_paths: Number of bootstrap paths per series (or asset).
+    - seed: Seed of the parent SeedSequence.
+    - workers: Number of worker processes; 1 runs in this process.
+    - paths_per_task: Number of paths generated per task.
 
-            # Generate the block of samples
-            for i in range(blocksize):
-                # Wrap around if the index exceeds the data length
-                sample_index = (index + i) % N
-                bootstrap_samples.append(historical_data[sample_index])
+    Returns:
+    - Bootstrap paths (array of shape (number_required, S * num_paths)) of S
+      series or assets; series s owns the columns s * num_paths + [0, num_paths),
+      so reshape(number_required, S, num_paths) separates them.
+    """
+    if isinstance(histories, np.ndarray) and histories.ndim == 2:
+        # a single history, one row per asset
+        history = np.ascontiguousarray(histories.T, dtype=float)
+        series = [(0, history.shape[1], 0)]
+    else:
+        histories = [np.asarray(h, dtype=float) for h in histories]
+        history = np.concatenate(histories)[np.newaxis]
+        offsets = np.cumsum([0] + [len(h) for h in histories])
+        series = [(offsets[s], len(h), s * num_paths) for s, h in enumerate(histories)]
+    out_shape = (number_required, history.shape[0] * len(series) * num_paths)
 
-                # Stop if we have enough samples
-                if len(bootstrap_samples) == number_required:
-                    break
+    tasks = [
+        (offset, length, column + start, num_paths, width, exp_block_size)
+        for offset, length, column in series
+        for start in range(0, num_paths, paths_per_task)
+        for width in [min(paths_per_task, num_paths - start)]
+    ]
+    seeds = spawn_seeds(seed, len(tasks))
 
-        # Append the generated path to the list of all paths
-        all_bootstrap_samples.append(bootstrap_samples[:number_required])
+    if workers <= 1:
+        # nothing to share, work on the arrays directly
+        _shared.update(history=history, out=np.empty(out_shape))
+        try:
+            for task, child in zip(tasks, seeds):
+                _bootstrap_task(*task, child)
+            return _shared["out"]
+        finally:
+            _shared.clear()
 
-    return all_bootstrap_samples
+    history_shm = SharedMemory(create=True, size=max(history.nbytes, 1))
+    out_shm = SharedMemory(
+        create=True, size=max(int(np.prod(out_shape)) * history.itemsize, 1)
+    )
+    try:
+        initargs = (
+            history_shm.name,
+            history.shape,
+            out_shm.name,
+            out_shape,
+            history.dtype,
+        )
+        _attach(*initargs)
+        _shared["history"][:] = history
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_attach, initargs=initargs
+        ) as executor:
+            futures = [
+                executor.submit(_bootstrap_task, *task, child)
+                for task, child in zip(tasks, seeds)
+            ]
+            for future in futures:
+                future.result()
+        return _shared["out"].copy()
+    finally:
+        _shared.clear()
+        for shm in (history_shm, out_shm):
+            shm.close()
+            shm.unlink()
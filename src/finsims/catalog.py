@@ -0,0 +1,240 @@
+import hashlib
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+
+from jsonl_utils import dataset_files, dataset_info, dataset_path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS datasets (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    name TEXT NOT NULL,
+    model TEXT,
+    source TEXT,
+    transformation TEXT,
+    format TEXT NOT NULL,
+    shape TEXT NOT NULL,
+    dtype TEXT NOT NULL,
+    params TEXT NOT NULL,
+    transform_params TEXT,
+    checksum TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    updated TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS datasets_model ON datasets (model, transformation);
+CREATE TABLE IF NOT EXISTS parameters (
+    dataset_id INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    value
+);
+CREATE INDEX IF NOT EXISTS parameters_key_value ON parameters (key, value);
+CREATE INDEX IF NOT EXISTS parameters_dataset ON parameters (dataset_id);
+"""
+OPERATORS = ("=", "!=", "<", "<=", ">", ">=")
+
+
+def _sqlite_value(value):
+    # SQLite integers are 64-bit; larger ones, such as the 128-bit entropy of
+    # an unseeded SeedSequence, are stored as text
+    if isinstance(value, int) and not -(2**63) <= value < 2**63:
+        return str(value)
+    return value
+
+
+def flatten_params(params, prefix=""):
+    """Flattens nested dicts of parameters to {"a.b": scalar} pairs."""
+    flat = {}
+    for key, value in params.items():
+        if isinstance(value, dict):
+            flat.update(flatten_params(value, f"{prefix}{key}."))
+        elif isinstance(value, (list, tuple)):
+            flat[f"{prefix}{key}"] = json.dumps(value)
+        else:
+            flat[f"{prefix}{key}"] = _sqlite_value(value)
+    return flat
+
+
+def files_checksum(paths):
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            while chunk := f.read(1 << 24):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DatasetCatalog:
+    """
+    A SQLite index of the generated datasets.
+
+    Every dataset file is one row with its model, parameters, transformation
+    and transform metadata, format, shape, dtype and checksum. Parameters are
+    also flattened into an indexed key/value table, so queries such as
+    find(model="mjd", transformation="db4", sigma=(">=", 0.2)) do not touch
+    the dataset files. Registration runs in one transaction, so concurrent
+    workers never observe half-registered datasets.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._transaction() as connection:
+            connection.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        # a connection per call, so that threads and processes can share the file
+        connection = sqlite3.connect(self.path, timeout=60)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.row_factory = sqlite3.Row
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def register(self, entries, format_, model, source, params):
+        """
+        Records the datasets of one source dataset and its transformations.
+
+        Checksums are recomputed only for files whose size or modification
+        time changed since they were registered.
+
+        Args:
+            entries: Dicts with the dataset "filename" (as passed to
+             save_dataset), its "transformation" (None for the source
+             dataset), optional static "transform_params" and an optional
+             "sidecar" JSON file whose contents extend the transform_params.
+            format_: The format the datasets were saved in.
+            model: The model name, e.g. "gbm", "mjd" or "real".
+            source: The name of the source dataset, e.g. "gbm-3".
+            params: The parameters of the source dataset; nested dicts are
+             indexed by dotted keys such as "seed.entropy".
+        """
+        rows = []
+        for entry in entries:
+            path = dataset_path(entry["filename"], format_)
+            files = dataset_files(entry["filename"], format_)
+            stats = [os.stat(file) for file in files]
+            shape, dtype = dataset_info(entry["filename"], format_)
+            transform_params = dict(entry.get("transform_params") or {})
+            if entry.get("sidecar"):
+                with open(entry["sidecar"], "r") as f:
+                    transform_params.update(json.load(f))
+            rows.append(
+                {
+                    "path": path,
+                    "name": os.path.basename(entry["filename"]),
+                    "model": model,
+                    "source": source,
+                    "transformation": entry.get("transformation"),
+                    "format": format_,
+                    "shape": json.dumps(list(shape)),
+                    "dtype": dtype,
+                    "params": json.dumps(params, sort_keys=True, default=str),
+                    "transform_params": json.dumps(transform_params, default=str),
+                    "size": sum(stat.st_size for stat in stats),
+                    "mtime": max(stat.st_mtime for stat in stats),
+                    "files": files,
+                }
+            )
+        flat_params = flatten_params(params)
+
+        # hash outside of the write transaction, which would block other workers
+        with self._transaction() as connection:
+            known = {
+                row["path"]: row
+                for row in connection.execute(
+                    "SELECT path, checksum, size, mtime FROM datasets "
+                    f"WHERE path IN ({', '.join('?' * len(rows))})",
+                    [row["path"] for row in rows],
+                )
+            }
+        for row in rows:
+            files = row.pop("files")
+            previous = known.get(row["path"])
+            if previous and (previous["size"], previous["mtime"]) == (
+                row["size"],
+                row["mtime"],
+            ):
+                row["checksum"] = previous["checksum"]
+            else:
+                row["checksum"] = files_checksum(files)
+            row["updated"] = datetime.now().isoformat(timespec="seconds")
+
+        with self._transaction() as connection:
+            for row in rows:
+                columns = ", ".join(row)
+                placeholders = ", ".join(f":{column}" for column in row)
+                updates = ", ".join(f"{column} = excluded.{column}" for column in row)
+                dataset_id = connection.execute(
+                    f"INSERT INTO datasets ({columns}) VALUES ({placeholders}) "
+                    f"ON CONFLICT (path) DO UPDATE SET {updates} RETURNING id",
+                    row,
+                ).fetchone()[0]
+                connection.execute(
+                    "DELETE FROM parameters WHERE dataset_id = ?", (dataset_id,)
+                )
+                connection.executemany(
+                    "INSERT INTO parameters VALUES (?, ?, ?)",
+                    [(dataset_id, key, value) for key, value in flat_params.items()],
+                )
+
+    def find(self, model=None, transformation=None, format_=None, **conditions):
+        """
+        Finds datasets by model, transformation, format and parameters.
+
+        Args:
+            model: The model name, or None for any.
+            transformation: None for the untransformed datasets, a
+             transformation name (e.g. "cos", "log-return", "db4") or "*" for
+             any.
+            format_: The format, or None for any.
+            conditions: Parameter conditions as key=value or
+             key=(operator, value) with an operator in OPERATORS; write
+             nested keys with double underscores, e.g. seed__entropy.
+             Integers beyond 64 bits are matched as strings.
+
+        Returns:
+            A list of dicts, one per dataset ordered by path, with shape,
+            params and transform_params decoded.
+        """
+        clauses, args = [], []
+        if model is not None:
+            clauses.append("model = ?")
+            args.append(model)
+        if transformation is None:
+            clauses.append("transformation IS NULL")
+        elif transformation != "*":
+            clauses.append("transformation = ?")
+            args.append(transformation)
+        if format_ is not None:
+            clauses.append("format = ?")
+            args.append(format_)
+        for key, condition in conditions.items():
+            operator, value = (
+                condition if isinstance(condition, tuple) else ("=", condition)
+            )
+            if operator not in OPERATORS:
+                raise ValueError(f"Unknown operator: {operator}")
+            clauses.append(
+                "id IN (SELECT dataset_id FROM parameters "
+                f"WHERE key = ? AND value {operator} ?)"
+            )
+            args += [key.replace("__", "."), _sqlite_value(value)]
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._transaction() as connection:
+            rows = connection.execute(
+                f"SELECT * FROM datasets {where} ORDER BY path", args
+            ).fetchall()
+        datasets = []
+        for row in rows:
+            dataset = dict(row)
+            for column in ("shape", "params", "transform_params"):
+                dataset[column] = json.loads(dataset[column] or "null")
+            datasets.append(dataset)
+        return datasets
@@ -1,13 +1,21 @@
+import argparse
+import re
+
 import yaml
+from catalog import DatasetCatalog
+
+DATA_ROOT = "Data/datasets/diffusionts_dataset"
 
 
-def create_yaml_config(dataset_number):
+def create_yaml_config(dataset, window=390):
+    # dataset: a catalog dataset name such as "gbm-3", or a bare gbm number
+    name = f"gbm-{dataset}" if isinstance(dataset, int) else dataset
     # Set the basic structure of the YAML content
     config = {
         "model": {
             "target": "Models.interpretable_diffusion.gaussian_diffusion.Diffusion_TS",
             "params": {
-                "seq_length": 390,
+                "seq_length": window,
                 "feature_size": 1,
                 "n_layer_enc": 2,
                 "n_layer_dec": 2,
@@ -27,7 +35,7 @@ def create_yaml_config(dataset_number):
         "solver": {
             "base_lr": 1.0e-5,
             "max_epochs": 10000,
-            "results_folder": f"./Checkpoints_gbm-{dataset_number}",
+            "results_folder": f"./Checkpoints_{name}",
             "gradient_accumulate_every": 2,
             "save_cycle": 1000,
             "ema": {"decay": 0.995, "update_interval": 10},
@@ -51,8 +59,8 @@ def create_yaml_config(dataset_number):
                 "params": {
                     "name": "stock",
                     "proportion": 1.0,
-                    "data_root": f"Data/datasets/diffusionts_dataset/gbm-{dataset_number}.csv",
-                    "window": 390,
+                    "data_root": f"{DATA_ROOT}/{name}.csv",
+                    "window": window,
                     "save2npy": True,
                     "neg_one_to_one": True,
                     "seed": 123,
@@ -64,8 +72,8 @@ def create_yaml_config(dataset_number):
                 "params": {
                     "name": "stock",
                     "proportion": 0.9,
-                    "data_root": f"Data/datasets/diffusionts_dataset/gbm-{dataset_number}.csv",
-                    "window": 390,
+                    "data_root": f"{DATA_ROOT}/{name}.csv",
+                    "window": window,
                     "save2npy": True,
                     "neg_one_to_one": True,
                     "seed": 123,
@@ -84,16 +92,58 @@ def create_yaml_config(dataset_number):
     }
 
     # Write YAML file
-    file_name = f"config_gbm_{dataset_number}.yaml"
+    file_name = f"config_{name.replace('-', '_')}.yaml"
     with open(file_name, "w") as file:
         yaml.dump(config, file, default_flow_style=False)
 
 
-def main():
-    # Generate YAML files for datasets gbm-1 to gbm-18
-    for i in range(1, 19):
-        create_yaml_config(i)
+def parse_condition(condition):
+    """Parses "key<op>value", e.g. "sigma>=0.2", into (key, (op, value))."""
+    match = re.fullmatch(r"([\w.]+)\s*(!=|<=|>=|=|<|>)\s*(.+)", condition)
+    if match is None:
+        raise ValueError(f"Cannot parse condition: {condition}")
+    key, operator, value = match.groups()
+    try:
+        value = float(value)
+    except ValueError:
+        pass
+    return key.replace(".", "__"), (operator, value)
+
+
+def main(catalog_path="data/catalog.sqlite", model="gbm", conditions=()):
+    """
+    Generates one config per diffusionts dataset of model in the catalog that
+    matches all conditions (see parse_condition).
+    """
+    datasets = DatasetCatalog(catalog_path).find(
+        model=model,
+        format_="diffusionts",
+        **dict(parse_condition(condition) for condition in conditions),
+    )
+    for dataset in datasets:
+        window = min(390, dataset["shape"][0])
+        create_yaml_config(dataset["name"], window)
+    print(f"Created {len(datasets)} configs")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(
+        description="Create Diffusion-TS configs for the datasets in the catalog."
+    )
+    parser.add_argument(
+        "--catalog",
+        type=str,
+        default="data/catalog.sqlite",
+        help="The SQLite dataset catalog written by the dataset drivers.",
+    )
+    parser.add_argument("-m", "--model", type=str, default="gbm")
+    parser.add_argument(
+        "-w",
+        "--where",
+        nargs="+",
+        default=[],
+        help='Parameter conditions, e.g. "sigma>=0.2" "n=1000".',
+    )
+    args = parser.parse_args()
+
+    main(args.catalog, args.model, args.where)
@@ -1,12 +1,23 @@
 import argparse
 import json
 import os
+import sys
 
-import pywt
-from gbm import simulate_gbm
-from jsonl_utils import save_dataset
-from transformations import cosine_transform, log_return
-from wavelet_transformations import wavelet_transform
+import numpy as np
+from catalog import DatasetCatalog
+from dataset_cache import DatasetCache, cached_simulation, code_version
+from dataset_pipeline import (
+    add_json_node,
+    add_save_node,
+    add_transformation_nodes,
+    run_jobs,
+    simulate_grid_and_save,
+)
+from gbm import simulate_gbm, simulate_gbm_chunks
+from jsonl_utils import ShardedDatasetWriter, dataset_path
+from pipeline import Pipeline
+from stage_profiling import StageProfiler
+from sweep_utils import seed_to_dict, spawn_seeds
 
 
 def load_config(config_path):
@@ -14,64 +25,160 @@ def load_config(config_path):
         return json.load(f)
 
 
-def main(format_, config_path, data_dir="data", transformations=None, normalization=None):
+def simulate_and_save(
+    i,
+    sim_param,
+    gbm_param,
+    seed_seq,
+    format_,
+    dir_path,
+    transformations,
+    normalization,
+    cache_dir=None,
+    cache_max_bytes=None,
+    profile=False,
+    catalog_path=None,
+):
+    n = sim_param["n"]
+    name = f"gbm-{i}"
+    os.makedirs(dir_path, exist_ok=True)
+    params = {"dt": 1 / n, **sim_param, **gbm_param}
+    seed = seed_to_dict(seed_seq)
+    simulation_key = {
+        "params": params,
+        "seed": seed,
+        "version": code_version(simulate_gbm),
+    }
+    profiler = StageProfiler(name) if profile else None
+    pipeline = Pipeline(f"{dir_path}/.pipeline/{name}.json", profiler=profiler)
+
+    entries = []
+    if format_ == "sharded" and not transformations:
+        # Nothing needs the full matrix, so stream shards with bounded memory
+        def stream_gbm():
+            rng = np.random.default_rng(seed_seq)
+            writer = ShardedDatasetWriter(f"{dir_path}/{name}")
+            for block in simulate_gbm_chunks(**params, rng=rng):
+                writer.append(block)
+
+        pipeline.add(
+            f"save:{dir_path}/{name}",
+            stream_gbm,
+            outputs=[dataset_path(f"{dir_path}/{name}", format_)],
+            key={**simulation_key, "format": format_},
+        )
+    else:
+        cache = DatasetCache(cache_dir, cache_max_bytes) if cache_dir else None
+        pipeline.add(
+            name,
+            lambda: cached_simulation(cache, "gbm", simulate_gbm, params, seed_seq),
+            key=simulation_key,
+        )
+        add_save_node(pipeline, name, f"{dir_path}/{name}", format_)
+        entries = add_transformation_nodes(
+            pipeline, name, name, dir_path, transformations, format_, normalization
+        )
+
+    parameters = {
+        "simulation_parameters": sim_param,
+        "gbm_parameters": gbm_param,
+        "seed": seed,
+    }
+    add_json_node(pipeline, f"{dir_path}/{name}-params.json", parameters)
+    pipeline.run()
+    if catalog_path:
+        DatasetCatalog(catalog_path).register(
+            [{"filename": f"{dir_path}/{name}"}] + entries,
+            format_,
+            "gbm",
+            name,
+            {**params, "seed": seed},
+        )
+    return profiler.records if profiler else None
+
+
+def main(
+    format_,
+    config_path,
+    data_dir="data",
+    transformations=None,
+    normalization=None,
+    workers=1,
+    seed=None,
+    cache_dir=None,
+    no_cache=False,
+    cache_max_gb=10.0,
+    profile=False,
+    batch_grid=False,
+    common_random_numbers=False,
+    catalog_path=None,
+):
     config = load_config(config_path)
     simulation_parameters = config["simulation_parameters"]
     gbm_parameters = config["gbm_parameters"]
 
-    i = 0
-    for sim_param in simulation_parameters:
-        for gbm_param in gbm_parameters:
-            n = sim_param["n"]
-            St = simulate_gbm(dt=1 / n, **sim_param, **gbm_param)
-            dir_path = f"{data_dir}"
-            os.makedirs(dir_path, exist_ok=True)
-            save_dataset(f"{dir_path}/gbm-{i}", St, format_)
-            for transformation in transformations:
-                if transformation == "cosine":
-                    St_cos = cosine_transform(St)
-                    if normalization == 'zscore':
-                        mean = St_cos.mean(axis=0)
-                        std = St_cos.std(axis=0)
-                        St_cos = (St_cos - mean) / std
-                        zscore_params = {
-                            "mean": mean.mean(),
-                            "std": std.mean(),
-                        }
-                        zscore_params_f = f"{dir_path}/zscore-gbm-{i}-params.json"
-                        with open(zscore_params_f, "w") as f:
-                            json.dump(zscore_params, f, indent=4)
-
-                    save_dataset(f"{dir_path}/cos-gbm-{i}", St_cos, format_)
-                elif transformation == "log-return":
-                    log_returns = log_return(St)
-                    save_dataset(f"{dir_path}/log-return-gbm-{i}", log_returns, format_)
-                else:
-                    if transformation in pywt.wavelist():
-                        coeffs, coeffs_shapes = wavelet_transform(St, transformation)
-                        save_dataset(
-                            f"{dir_path}/{transformation}-gbm-{i}", coeffs, format_
-                        )
-                        wavelet_params_f = (
-                            f"{dir_path}/{transformation}-gbm-{i}-params.json"
-                        )
-                        wavelet_params = {
-                            "coeffs_shapes": coeffs_shapes[0].flatten().tolist(),
-                            "sequence_length": coeffs.shape[0],
-                            "wavelet_name": transformation,
-                        }
-                        with open(wavelet_params_f, "w") as f:
-                            json.dump(wavelet_params, f, indent=4)
+    # Number the jobs up front so that gbm-{i} does not depend on scheduling
+    grid = [
+        (sim_param, gbm_param)
+        for sim_param in simulation_parameters
+        for gbm_param in gbm_parameters
+    ]
+    # unseeded runs draw fresh entropy, so their cache entries could never be hit
+    if no_cache or seed is None:
+        cache_dir = None
+    else:
+        cache_dir = cache_dir or f"{data_dir}/.cache"
+    cache_max_bytes = int(cache_max_gb * 2**30)
+    catalog_path = catalog_path or f"{data_dir}/catalog.sqlite"
+    if batch_grid:
+        # one job per simulation_parameters entry; gbm-{i} numbering is kept
+        seeds = spawn_seeds(seed, len(simulation_parameters))
+        jobs = [
+            (
+                f"gbm-grid-{g * len(gbm_parameters)}",
+                (
+                    "gbm",
+                    simulate_gbm,
+                    g * len(gbm_parameters),
+                    sim_param,
+                    gbm_parameters,
+                    seeds[g],
+                    format_,
+                    data_dir,
+                    transformations or [],
+                    normalization,
+                    common_random_numbers,
+                    profile,
+                    catalog_path,
+                    None,
+                ),
+            )
+            for g, sim_param in enumerate(simulation_parameters)
+        ]
+        return run_jobs(simulate_grid_and_save, jobs, workers, data_dir, profile)
 
-            parameters = {
-                "simulation_parameters": sim_param,
-                "gbm_parameters": gbm_param,
-            }
-            param_filename = f"{dir_path}/gbm-{i}-params.json"
-            with open(param_filename, "w") as f:
-                json.dump(parameters, f, indent=4)
-
-            i += 1
+    seeds = spawn_seeds(seed, len(grid))
+    jobs = [
+        (
+            f"gbm-{i}",
+            (
+                i,
+                sim_param,
+                gbm_param,
+                seeds[i],
+                format_,
+                data_dir,
+                transformations or [],
+                normalization,
+                cache_dir,
+                cache_max_bytes,
+                profile,
+                catalog_path,
+            ),
+        )
+        for i, (sim_param, gbm_param) in enumerate(grid)
+    ]
+    return run_jobs(simulate_and_save, jobs, workers, data_dir, profile)
 
 
 if __name__ == "__main__":
@@ -82,7 +189,8 @@ if __name__ == "__main__":
         "-f",
         "--format",
         type=str,
-        help="The format to save the dataset (e.g., 'diffusionts' or 'tsdiff').",
+        help="The format to save the dataset "
+        "('diffusionts', 'tsdiff', 'npy', 'npz' or 'sharded').",
     )
     parser.add_argument(
         "-c", "--config_path", type=str, help="The path to the configuration file."
@@ -108,6 +216,82 @@ if __name__ == "__main__":
         default=None,
         help="The normalization to apply to the dataset.",
     )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="The number of worker processes used to run the parameter grid.",
+    )
+    parser.add_argument(
+        "-s",
+        "--seed",
+        type=int,
+        default=None,
+        help="The parent seed from which per-dataset seeds are derived. Without "
+        "a seed every run draws fresh entropy and the simulation cache is not "
+        "used.",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="The directory of the simulation cache (default: <data_dir>/.cache).",
+    )
+    parser.add_argument(
+        "--no_cache",
+        "--no-cache",
+        action="store_true",
+        help="Always simulate instead of reusing cached datasets.",
+    )
+    parser.add_argument(
+        "--cache_max_gb",
+        type=float,
+        default=10.0,
+        help="The size cap of the simulation cache in GB (LRU eviction).",
+    )
+    parser.add_argument(
+        "--batch_grid",
+        action="store_true",
+        help="Simulate all gbm_parameters sharing simulation parameters in one "
+        "broadcasted call (seeded per simulation_parameters entry). The datasets "
+        "keep their names but not their random draws, so switching modes "
+        "rebuilds them.",
+    )
+    parser.add_argument(
+        "--common_random_numbers",
+        action="store_true",
+        help="With --batch_grid, reuse the same Brownian increments for every "
+        "parameter set.",
+    )
+    parser.add_argument(
+        "--catalog",
+        type=str,
+        default=None,
+        help="The SQLite dataset catalog (default: <data_dir>/catalog.sqlite).",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Measure every stage and write a JSON report to the data directory.",
+    )
     args = parser.parse_args()
 
-    main(args.format, args.config_path, args.data_dir, args.transformations, args.normalization)
+    failures = main(
+        args.format,
+        args.config_path,
+        args.data_dir,
+        args.transformations,
+        args.normalization,
+        args.workers,
+        args.seed,
+        args.cache_dir,
+        args.no_cache,
+        args.cache_max_gb,
+        args.profile,
+        args.batch_grid,
+        args.common_random_numbers,
+        args.catalog,
+    )
+    sys.exit(1 if failures else 0)
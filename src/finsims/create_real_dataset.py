@@ -1,31 +1,113 @@
 import argparse
 import os
-import json
-import yfinance as yf
-from jsonl_utils import save_dataset
+import sys
+from datetime import datetime
+
+from catalog import DatasetCatalog
+from dataset_pipeline import add_save_node, write_json
+from normalization import StreamingZScore, fit_zscore
+from pipeline import Pipeline
+from price_store import CSVDirectorySource, PriceStore, YFinanceSource, ingest
+from stage_profiling import StageProfiler, print_summary, write_report
 from transformations import log_return
 
 
-def main(format_, data_dir, n, symbols, normalization=None):
+def stored_log_returns(store, symbol, n):
+    _, prices = store.load(symbol)
+    log_returns = log_return(prices)
+    max_length = log_returns.shape[0] - log_returns.shape[0] % n
+    return log_returns[:max_length].reshape(-1, n)
+
+
+def main(
+    format_,
+    data_dir,
+    n,
+    symbols,
+    normalization=None,
+    profile=False,
+    store_dir=None,
+    csv_dir=None,
+    fetch_workers=8,
+    offline=False,
+    catalog_path=None,
+):
+    os.makedirs(data_dir, exist_ok=True)
+    store = PriceStore(store_dir or f"{data_dir}/prices")
+    failures = {}
+    if not offline:
+        price_source = CSVDirectorySource(csv_dir) if csv_dir else YFinanceSource()
+        failures = ingest(symbols, price_source, store, fetch_workers)
+
+    profiler = StageProfiler("real") if profile else None
+    pipeline = Pipeline(f"{data_dir}/.pipeline/real.json", profiler=profiler)
+    registrations = []
     for symbol in symbols:
-        data = yf.download(symbol, period="max")
-        data = data["Adj Close"]
-        log_returns = log_return(data.dropna().to_numpy())
-        max_length = log_returns.shape[0] - log_returns.shape[0] % n
-        log_returns = log_returns[:max_length].reshape(-1, n)
-        os.makedirs(data_dir, exist_ok=True)
-        if normalization == 'zscore':
-            mean = log_returns.mean(axis=1)
-            std = log_returns.std(axis=1)
-            log_returns = (log_returns - mean[:, None]) / std[:, None]
-            zscore_params = {
-                "mean": mean.mean(),
-                "std": std.mean(),
+        last_date = store.last_date(symbol)
+        if last_date is None:
+            print(f"No stored prices for {symbol}, skipping", file=sys.stderr)
+            failures.setdefault(symbol, LookupError("no stored prices"))
+            continue
+        source = f"log-returns-{symbol}"
+        entry = {
+            "filename": f"{data_dir}/{symbol}_log_return",
+            "transformation": "log-return",
+        }
+        params = {"symbol": symbol, "n": n, "last_date": str(last_date)}
+        # datasets are rebuilt only when the store holds newer prices
+        pipeline.add(
+            source,
+            lambda symbol=symbol: stored_log_returns(store, symbol, n),
+            key=params,
+        )
+        pipeline.add(
+            f"transpose-{symbol}", lambda log_returns: log_returns.T, inputs=[source]
+        )
+        source = f"transpose-{symbol}"
+        if normalization == "zscore":
+            # one path per row of log returns, i.e. per column after transposing
+            pipeline.add(
+                f"zscore-{symbol}",
+                lambda log_returns: fit_zscore([log_returns], mode="path"),
+                inputs=[source],
+            )
+            pipeline.add(
+                f"zscore-data-{symbol}",
+                StreamingZScore.apply,
+                inputs=[f"zscore-{symbol}", source],
+            )
+            zscore_params_f = f"{data_dir}/zscore-{symbol}-params.json"
+            pipeline.add(
+                f"write:{zscore_params_f}",
+                lambda zscore, path=zscore_params_f: write_json(path, zscore.summary()),
+                inputs=[f"zscore-{symbol}"],
+                outputs=[zscore_params_f],
+            )
+            zscore_vectors_f = f"{data_dir}/zscore-{symbol}-params.npz"
+            pipeline.add(
+                f"write:{zscore_vectors_f}",
+                lambda zscore, path=zscore_vectors_f: zscore.save(path),
+                inputs=[f"zscore-{symbol}"],
+                outputs=[zscore_vectors_f],
+                io=True,
+            )
+            source = f"zscore-data-{symbol}"
+            entry["transform_params"] = {
+                "normalization": "zscore",
+                "zscore_params": zscore_vectors_f,
             }
-            zscore_params_f = f"{data_dir}/zscore-params.json"
-            with open(zscore_params_f, "w") as f:
-                json.dump(zscore_params, f, indent=4)
-        save_dataset(f"{data_dir}/{symbol}_log_return", log_returns.T, format_)
+            entry["sidecar"] = zscore_params_f
+        add_save_node(pipeline, source, entry["filename"], format_)
+        registrations.append((symbol, entry, params))
+    pipeline.run()
+    catalog = DatasetCatalog(catalog_path or f"{data_dir}/catalog.sqlite")
+    for symbol, entry, params in registrations:
+        catalog.register([entry], format_, "real", symbol, params)
+    if profile:
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        write_report(f"{data_dir}/profile-{timestamp}.json", profiler.records)
+        print_summary(profiler.records)
+    return failures
 
 
 if __name__ == "__main__":
@@ -37,7 +119,8 @@ if __name__ == "__main__":
         "--format",
         default="tsdiff",
         type=str,
-        help="The format to save the dataset (e.g., 'diffusionts' or 'tsdiff').",
+        help="The format to save the dataset "
+        "('diffusionts', 'tsdiff', 'npy', 'npz' or 'sharded').",
     )
 
     parser.add_argument(
@@ -70,6 +153,54 @@ if __name__ == "__main__":
         help="The normalization to apply to the dataset.",
     )
 
+    parser.add_argument(
+        "--store_dir",
+        type=str,
+        default=None,
+        help="The local price store directory (default: <data_dir>/prices).",
+    )
+    parser.add_argument(
+        "--csv_dir",
+        type=str,
+        default=None,
+        help="Read prices from <csv_dir>/<symbol>.csv instead of Yahoo Finance.",
+    )
+    parser.add_argument(
+        "-w",
+        "--fetch_workers",
+        type=int,
+        default=8,
+        help="The maximum number of concurrent price downloads.",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Use the local price store only, without fetching new prices.",
+    )
+    parser.add_argument(
+        "--catalog",
+        type=str,
+        default=None,
+        help="The SQLite dataset catalog (default: <data_dir>/catalog.sqlite).",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Measure every stage and write a JSON report to the data directory.",
+    )
     args = parser.parse_args()
 
-    main(args.format, args.data_dir, args.n, args.symbols, args.normalization)
+    failures = main(
+        args.format,
+        args.data_dir,
+        args.n,
+        args.symbols,
+        args.normalization,
+        args.profile,
+        args.store_dir,
+        args.csv_dir,
+        args.fetch_workers,
+        args.offline,
+        args.catalog,
+    )
+    sys.exit(1 if failures else 0)
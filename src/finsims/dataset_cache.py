@@ -0,0 +1,129 @@
+import hashlib
+import inspect
+import json
+import os
+
+import numpy as np
+from sweep_utils import seed_to_dict
+
+
+def _local_dependencies(module, files):
+    # the source files of module and, recursively, of the modules it imports
+    # from its own directory (e.g. gbm.py -> samplers.py)
+    path = os.path.abspath(inspect.getsourcefile(module))
+    if path in files:
+        return files
+    files.append(path)
+    for value in vars(module).values():
+        dependency = value if inspect.ismodule(value) else inspect.getmodule(value)
+        source = getattr(dependency, "__file__", None)
+        if source and os.path.dirname(os.path.abspath(source)) == os.path.dirname(path):
+            _local_dependencies(dependency, files)
+    return files
+
+
+def code_version(fn):
+    """
+    Hash of the source file defining fn and of the sibling modules it imports,
+    so cache entries expire with code changes.
+    """
+    digest = hashlib.sha256()
+    for path in sorted(_local_dependencies(inspect.getmodule(fn), [])):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def cache_key(model, params, seed, dtype, version):
+    """
+    Content address of a simulated dataset.
+
+    Args:
+        model: The model name (e.g. "gbm" or "mjd").
+        params: A dict of simulation and model parameters, including n and M.
+        seed: A JSON-serializable description of the seed (see seed_to_dict).
+        dtype: The dtype of the simulated array.
+        version: The simulator code version (see code_version).
+    """
+    key = {
+        "model": model,
+        "params": params,
+        "seed": seed,
+        "dtype": np.dtype(dtype).name,
+        "version": version,
+    }
+    payload = json.dumps(key, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class DatasetCache:
+    """
+    A directory of .npy arrays addressed by cache_key, capped at max_bytes.
+
+    Hits are memory-mapped read-only and refresh the entry's modification
+    time, which is used as the recency for LRU eviction.
+    """
+
+    def __init__(self, cache_dir, max_bytes=10 * 2**30):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            array = np.load(path, mmap_mode="r")
+            os.utime(path)
+        except (FileNotFoundError, ValueError):
+            return None
+        return array
+
+    def put(self, key, array):
+        path = self._path(key)
+        # write to a private file and rename, so concurrent workers never
+        # observe a partially written entry
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".npy"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def cached_simulation(cache, model, simulate, params, seed_seq, dtype=np.float64):
+    """
+    Returns simulate(**params, rng=..., dtype=dtype), taken from the cache when
+    possible and simulated and stored otherwise. cache=None disables caching.
+    """
+    if cache is None:
+        return simulate(**params, rng=np.random.default_rng(seed_seq), dtype=dtype)
+    key = cache_key(
+        model, params, seed_to_dict(seed_seq), dtype, code_version(simulate)
+    )
+    St = cache.get(key)
+    if St is None:
+        St = simulate(**params, rng=np.random.default_rng(seed_seq), dtype=dtype)
+        cache.put(key, St)
+    return St
@@ -0,0 +1,286 @@
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pywt
+from catalog import DatasetCatalog
+from dataset_cache import code_version
+from jsonl_utils import dataset_path, save_dataset
+from normalization import StreamingZScore, fit_zscore
+from pipeline import Pipeline
+from stage_profiling import StageProfiler, print_summary, write_report
+from sweep_utils import run_sweep, seed_to_dict
+from transformations import cosine_transform, log_return
+from wavelet_transformations import wavelet_transform_batch
+
+
+def write_json(path, obj):
+    with open(path, "w") as f:
+        json.dump(obj, f, indent=4)
+
+
+def add_json_node(pipeline, path, obj):
+    pipeline.add(
+        f"write:{path}", lambda: write_json(path, obj), outputs=[path], key=obj, io=True
+    )
+
+
+def add_save_node(pipeline, source, filename, format_):
+    path = dataset_path(filename, format_)
+    pipeline.add(
+        f"save:{filename}",
+        lambda St: save_dataset(filename, St, format_),
+        inputs=[source],
+        outputs=[path],
+        key={"format": format_},
+        io=True,
+    )
+
+
+def add_transformation_nodes(
+    pipeline,
+    source,
+    name,
+    dir_path,
+    transformations,
+    format_,
+    normalization=None,
+    log_return_name=None,
+):
+    """
+    Adds the transformation, normalization and save nodes of one dataset.
+
+    Args:
+        pipeline: The Pipeline to extend.
+        source: The name of the node holding the (n, M) price array.
+        name: The dataset name, e.g. "gbm-3".
+        dir_path: The directory the datasets are saved to.
+        transformations: "cos"/"cosine", "log-return" and pywt wavelet names.
+        format_: The format passed to save_dataset.
+        normalization: "zscore" normalizes the cosine coefficients.
+        log_return_name: The file name of the log returns (default log-return-{name}).
+
+    Returns:
+        entries: The transformed datasets as DatasetCatalog.register entries.
+    """
+    entries = []
+    for transformation in transformations:
+        if transformation in ("cos", "cosine"):
+            pipeline.add(f"cos-{name}", cosine_transform, inputs=[source])
+            cos_node = f"cos-{name}"
+            entry = {"filename": f"{dir_path}/cos-{name}", "transformation": "cos"}
+            if normalization == "zscore":
+                pipeline.add(
+                    f"zscore-{name}",
+                    lambda coeffs: fit_zscore([coeffs], mode="path"),
+                    inputs=[cos_node],
+                    key={"normalization": "zscore", "mode": "path"},
+                )
+                # normalizes the coefficients in place, nothing else reads them
+                pipeline.add(
+                    f"zscore-data-{name}",
+                    StreamingZScore.apply,
+                    inputs=[f"zscore-{name}", cos_node],
+                )
+                zscore_params_f = f"{dir_path}/zscore-{name}-params.json"
+                pipeline.add(
+                    f"write:{zscore_params_f}",
+                    lambda zscore, path=zscore_params_f: write_json(
+                        path, zscore.summary()
+                    ),
+                    inputs=[f"zscore-{name}"],
+                    outputs=[zscore_params_f],
+                    io=True,
+                )
+                zscore_vectors_f = f"{dir_path}/zscore-{name}-params.npz"
+                pipeline.add(
+                    f"write:{zscore_vectors_f}",
+                    lambda zscore, path=zscore_vectors_f: zscore.save(path),
+                    inputs=[f"zscore-{name}"],
+                    outputs=[zscore_vectors_f],
+                    io=True,
+                )
+                cos_node = f"zscore-data-{name}"
+                entry["transform_params"] = {
+                    "normalization": "zscore",
+                    "zscore_params": zscore_vectors_f,
+                }
+                entry["sidecar"] = zscore_params_f
+            add_save_node(pipeline, cos_node, f"{dir_path}/cos-{name}", format_)
+            entries.append(entry)
+        elif transformation == "log-return":
+            pipeline.add(f"log-return-{name}", log_return, inputs=[source])
+            filename = f"{dir_path}/{log_return_name or f'log-return-{name}'}"
+            add_save_node(pipeline, f"log-return-{name}", filename, format_)
+            entries.append({"filename": filename, "transformation": "log-return"})
+        elif transformation in pywt.wavelist():
+            node = f"{transformation}-{name}"
+            pipeline.add(
+                node,
+                lambda St, wavelet=transformation: wavelet_transform_batch(St, wavelet),
+                inputs=[source],
+                key={"wavelet": transformation},
+            )
+            pipeline.add(f"{node}-coeffs", lambda pair: pair[0], inputs=[node])
+            add_save_node(pipeline, f"{node}-coeffs", f"{dir_path}/{node}", format_)
+            wavelet_params_f = f"{dir_path}/{node}-params.json"
+            pipeline.add(
+                f"write:{wavelet_params_f}",
+                lambda pair, path=wavelet_params_f, wavelet=transformation: write_json(
+                    path,
+                    {
+                        "coeffs_shapes": pair[1],
+                        "sequence_length": pair[0].shape[0],
+                        "wavelet_name": wavelet,
+                    },
+                ),
+                inputs=[node],
+                outputs=[wavelet_params_f],
+                io=True,
+            )
+            entries.append(
+                {
+                    "filename": f"{dir_path}/{node}",
+                    "transformation": transformation,
+                    "sidecar": wavelet_params_f,
+                }
+            )
+    return entries
+
+
+def simulate_grid_and_save(
+    model,
+    simulate,
+    first_i,
+    sim_param,
+    model_params,
+    seed_seq,
+    format_,
+    dir_path,
+    transformations,
+    normalization=None,
+    common_random_numbers=False,
+    profile=False,
+    catalog_path=None,
+    log_return_name=None,
+):
+    """
+    Simulates all model_params sharing sim_param as one (P, n+1, M) computation
+    and saves them as {model}-{first_i}, ..., {model}-{first_i + P - 1}.
+
+    These are the files the per-dataset jobs write, with different random
+    draws. Each mode records its own pipeline state, and the output
+    signatures in that state make either mode rebuild the files the other
+    one wrote.
+
+    Args:
+        model: The model name, e.g. "gbm" or "mjd".
+        simulate: The simulator, taking the model parameters as arrays of P
+         values (simulate_gbm or simulate_merton_jump_diffusion).
+        first_i: The index of the first dataset.
+        sim_param: The simulation parameters (n and M) shared by the grid.
+        model_params: The P dicts of model parameters.
+        seed_seq: The SeedSequence of the grid.
+        format_, dir_path, transformations, normalization: As for
+         add_transformation_nodes.
+        common_random_numbers: Drive all parameter sets with the same normals.
+        profile: Measure every stage with a StageProfiler.
+        catalog_path: The DatasetCatalog to register the datasets in.
+        log_return_name: A template such as "log-returns-{i}" for the file
+         names of the log returns (default log-return-{name}).
+
+    Returns:
+        The profiler records, or None without profile.
+    """
+    n = sim_param["n"]
+    os.makedirs(dir_path, exist_ok=True)
+    grid_params = {
+        key: np.array([model_param[key] for model_param in model_params])
+        for key in model_params[0]
+    }
+    seed = seed_to_dict(seed_seq)
+    profiler = StageProfiler(f"{model}-grid-{first_i}") if profile else None
+    pipeline = Pipeline(
+        f"{dir_path}/.pipeline/{model}-grid-{first_i}.json", profiler=profiler
+    )
+    pipeline.add(
+        "grid",
+        lambda: simulate(
+            dt=1 / n,
+            **sim_param,
+            **grid_params,
+            rng=np.random.default_rng(seed_seq),
+            common_random_numbers=common_random_numbers,
+        ),
+        key={
+            "sim_param": sim_param,
+            f"{model}_params": model_params,
+            "seed": seed,
+            "common_random_numbers": common_random_numbers,
+            "version": code_version(simulate),
+        },
+    )
+    registrations = []
+    for p, model_param in enumerate(model_params):
+        i = first_i + p
+        name = f"{model}-{i}"
+        pipeline.add(name, lambda grid, p=p: grid[p], inputs=["grid"])
+        add_save_node(pipeline, name, f"{dir_path}/{name}", format_)
+        entries = add_transformation_nodes(
+            pipeline,
+            name,
+            name,
+            dir_path,
+            transformations,
+            format_,
+            normalization,
+            log_return_name=log_return_name and log_return_name.format(i=i),
+        )
+        parameters = {
+            "simulation_parameters": sim_param,
+            f"{model}_parameters": model_param,
+            "seed": {
+                **seed,
+                "grid_index": p,
+                "common_random_numbers": common_random_numbers,
+            },
+        }
+        add_json_node(pipeline, f"{dir_path}/{name}-params.json", parameters)
+        registrations.append(
+            (
+                name,
+                entries,
+                {"dt": 1 / n, **sim_param, **model_param, "seed": parameters["seed"]},
+            )
+        )
+    pipeline.run()
+    if catalog_path:
+        catalog = DatasetCatalog(catalog_path)
+        for name, entries, params in registrations:
+            catalog.register(
+                [{"filename": f"{dir_path}/{name}"}] + entries,
+                format_,
+                model,
+                name,
+                params,
+            )
+    return profiler.records if profiler else None
+
+
+def run_jobs(job, jobs, workers, data_dir, profile):
+    """
+    Runs the dataset jobs with run_sweep and, with profile, writes and prints
+    the profiler records they return.
+
+    Returns:
+        failures: A dict mapping the names of failed jobs to their exceptions.
+    """
+    results = {}
+    failures = run_sweep(job, jobs, workers, results)
+    if profile:
+        records = [r for job_name, _ in jobs for r in results.get(job_name) or []]
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        write_report(f"{data_dir}/profile-{timestamp}.json", records)
+        print_summary(records)
+    return failures
@@ -1,21 +1,116 @@
 import matplotlib.pyplot as plt
 import numpy as np
+from samplers import standard_normals
 
 
-def simulate_gbm(mu, sigma, n, M, dt, s0=None):
-    St = np.exp(
-        (mu - (sigma**2) / 2) * dt
-        + sigma * np.sqrt(dt) * np.random.normal(0, 1, size=(M, n)).T
-    )
-    if s0 is not None:
-        St = np.vstack([np.ones(M), St])
-        St = s0 * St.cumprod(axis=0)
+def _simulate_gbm_block(
+    mu, sigma, n, M, dt, s0, rng, dtype, common_random_numbers=False, sampler="pseudo"
+):
+    # Normals are drawn path-major so that consecutive blocks consume the RNG
+    # stream exactly like a single block of the combined width
+    batch_shape = np.broadcast(mu, sigma).shape
+    if batch_shape:
+        # one parameter set per leading index, broadcast over (M, n)
+        mu, sigma = (
+            np.reshape(np.broadcast_to(p, batch_shape), batch_shape + (1, 1))
+            for p in (mu, sigma)
+        )
+    if batch_shape and common_random_numbers:
+        # the same Brownian increments for every parameter set
+        increments = np.multiply(
+            standard_normals(rng, M, (n,), sampler, dtype),
+            sigma * np.sqrt(dt),
+            dtype=dtype,
+        )
     else:
-        St = St.cumprod(axis=0)
+        # path-major across parameter sets too, viewed as (..., M, n)
+        increments = standard_normals(rng, M, batch_shape + (n,), sampler, dtype)
+        increments = np.moveaxis(increments, 0, -2)
+        increments *= sigma * np.sqrt(dt)
+    increments += (mu - (sigma**2) / 2) * dt
+    np.exp(increments, out=increments)
+    np.cumprod(increments, axis=-1, out=increments)
+    if s0 is None:
+        return np.swapaxes(increments, -1, -2)
 
+    St = np.empty(batch_shape + (n + 1, M), dtype=dtype)
+    St[..., 0, :] = s0
+    np.multiply(np.swapaxes(increments, -1, -2), s0, out=St[..., 1:, :])
     return St
 
 
+def simulate_gbm(
+    mu,
+    sigma,
+    n,
+    M,
+    dt,
+    s0=None,
+    rng=None,
+    dtype=np.float64,
+    common_random_numbers=False,
+    sampler="pseudo",
+):
+    """
+    Simulate M paths of geometric Brownian motion.
+
+    Parameters:
+    - mu, sigma: Drift and volatility; arrays of P parameter sets simulate the
+      whole grid in one call.
+    - n: Number of time steps.
+    - M: Number of simulation paths.
+    - dt: Time step size.
+    - s0: Initial price; if None the paths start at the first step (shape (n, M)).
+    - rng: numpy Generator or seed.
+    - dtype: Output dtype (np.float64 or np.float32).
+    - common_random_numbers: Reuse the same Brownian increments for every
+      parameter set.
+    - sampler: How the Brownian increments are sampled: "pseudo",
+      "antithetic", "sobol" or "moment_matching" (see samplers.standard_normals).
+
+    Returns:
+    - St: Simulated prices (array of shape (n+1, M), or (n, M) if s0 is None,
+      with a leading P axis for array parameters).
+    """
+    rng = np.random.default_rng(rng)
+    return _simulate_gbm_block(
+        mu, sigma, n, M, dt, s0, rng, dtype, common_random_numbers, sampler
+    )
+
+
+def simulate_gbm_chunks(
+    mu,
+    sigma,
+    n,
+    M,
+    dt,
+    s0=None,
+    chunk_size=10000,
+    rng=None,
+    dtype=np.float64,
+    common_random_numbers=False,
+    sampler="pseudo",
+):
+    """
+    Stream GBM paths in blocks of at most chunk_size paths.
+
+    Blocks share nothing but the RNG, so peak memory is bounded by one block.
+    With the same seed, concatenating the blocks along the last axis gives the
+    same paths as simulate_gbm. Other samplers apply per block (antithetic
+    pairs, Sobol points and matched moments stay within a block).
+
+    Yields:
+    - Arrays of shape (n+1, width) (or (n, width) if s0 is None, with a leading
+      P axis for array parameters).
+    """
+    rng = np.random.default_rng(rng)
+    for start in range(0, M, chunk_size):
+        width = min(chunk_size, M - start)
+        yield _simulate_gbm_block(
+            mu, sigma, n, width, dt, s0, rng, dtype, common_random_numbers, sampler
+        )
+
+
 def plot_gbm(St, n, M, dt, mu, sigma, s0=None):
     time = np.linspace(0, n * dt, St.shape[0])
     tt = np.full(shape=(M, St.shape[0]), fill_value=time).T
@@ -30,38 +125,85 @@ def plot_gbm(St, n, M, dt, mu, sigma, s0=None):
     plt.show()
 
 
-def estimate_sigma(series, dt):
-    return np.sqrt((np.diff(series) ** 2).sum() / (len(series) * dt))
+def estimate_sigma(series, dt, axis=0):
+    length = series.shape[axis]
+    return np.sqrt((np.diff(series, axis=axis) ** 2).sum(axis=axis) / (length * dt))
 
 
-def estimate_log_mu(series, dt):
-    return (series[-1] - series[0]) / (len(series) * dt)
+def estimate_log_mu(series, dt, axis=0):
+    length = series.shape[axis]
+    first = np.take(series, 0, axis=axis)
+    last = np.take(series, -1, axis=axis)
+    return (last - first) / (length * dt)
 
 
-def estimate_mle_log_mu(series, dt):
-    tt = np.linspace(0, len(series) * dt, len(series))
+def mle_log_mu_weights(length, dt):
+    """
+    Time-grid weights w such that the MLE log drift of a series x is w @ x.
+    They depend only on the series length, so they can be computed once.
+    """
+    tt = np.linspace(0, length * dt, length)
     total = (1.0 / dt) * (tt**2).sum()
-    return 1 / total * (1.0 / dt) * (tt * series).sum()
+    return 1 / total * (1.0 / dt) * tt
+
+
+def estimate_mle_log_mu(series, dt, axis=0, weights=None):
+    if weights is None:
+        weights = mle_log_mu_weights(series.shape[axis], dt)
+    return np.tensordot(weights, series, axes=(0, axis))
 
 
 def estimate_mu(log_mu, sigma):
     return log_mu + 0.5 * sigma**2
 
 
+def _estimate_path_parameters(series, dt, mle_estimator, weights):
+    # series holds prices of shape (n, M); estimates are returned per path
+    log_st = np.log(series)
+    estimated_sigmas = estimate_sigma(log_st, dt=dt)
+    if mle_estimator:
+        log_mu = estimate_mle_log_mu(log_st, dt=dt, weights=weights)
+    else:
+        log_mu = estimate_log_mu(log_st, dt=dt)
+    estimated_mus = estimate_mu(log_mu, estimated_sigmas)
+    return estimated_sigmas, estimated_mus
+
+
 def estimate_parameters(series, dt, ret_distribution=False, mle_estimator=False):
-    log_st = np.log(series).T
-    estimated_mus = []
-    estimated_sigmas = []
-    log_mu_estimator = estimate_mle_log_mu if mle_estimator else estimate_log_mu
-    for i, path in enumerate(log_st):
-        estimated_sigma = estimate_sigma(path, dt=dt)
-        log_mu = log_mu_estimator(path, dt=dt)
-        estimated_mu = estimate_mu(log_mu, estimated_sigma)
-        estimated_mus.append(estimated_mu)
-        estimated_sigmas.append(estimated_sigma)
-    estimated_sigmas = np.array(estimated_sigmas)
-    estimated_mus = np.array(estimated_mus)
+    weights = mle_log_mu_weights(series.shape[0], dt) if mle_estimator else None
+    estimated_sigmas, estimated_mus = _estimate_path_parameters(
+        series, dt, mle_estimator, weights
+    )
     if ret_distribution:
         return estimated_sigmas, estimated_mus
     else:
         return estimated_sigmas.mean(), estimated_mus.mean()
+
+
+def estimate_parameters_streaming(
+    chunks, dt, ret_distribution=False, mle_estimator=False
+):
+    """
+    estimate_parameters over an iterable of (n, m) path blocks, e.g. from
+    simulate_gbm_chunks or load_sharded, without holding all paths in memory.
+    Only running sums are kept unless ret_distribution is set.
+    """
+    weights = None
+    sigma_sum, mu_sum, count = 0.0, 0.0, 0
+    sigma_blocks, mu_blocks = [], []
+    for chunk in chunks:
+        if mle_estimator and weights is None:
+            weights = mle_log_mu_weights(chunk.shape[0], dt)
+        estimated_sigmas, estimated_mus = _estimate_path_parameters(
+            chunk, dt, mle_estimator, weights
+        )
+        if ret_distribution:
+            sigma_blocks.append(estimated_sigmas)
+            mu_blocks.append(estimated_mus)
+        sigma_sum += estimated_sigmas.sum()
+        mu_sum += estimated_mus.sum()
+        count += chunk.shape[1]
+    if ret_distribution:
+        return np.concatenate(sigma_blocks), np.concatenate(mu_blocks)
+    else:
+        return sigma_sum / count, mu_sum / count
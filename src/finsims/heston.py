@@ -1,6 +1,15 @@
+import argparse
+import math
+import time
+
 import matplotlib.pyplot as plt
 import numpy as np
 from gbm import estimate_parameters
+from numba import njit
+from samplers import standard_normals
+from scipy.integrate import quad
+
+SCHEMES = ("euler", "qe")
 
 
 def main():
@@ -42,7 +51,109 @@ def plot_heston(N, S_p, T, v_p):
     plt.show()
 
 
-def heston_model_sim(S0, v0, rho, kappa, theta, sigma, T, N, M, r):
+@njit(cache=True)
+def _heston_kernel(
+    S, v, rho, kappa, theta, sigma, dt, r, N, save_every, rng, Z, S_out, v_out
+):
+    # Full-truncation Euler: the variance state may go negative, but only its
+    # positive part enters the drift and diffusion terms
+    M = S.shape[0]
+    sqrt_dt = np.sqrt(dt)
+    rho_bar = np.sqrt(1.0 - rho**2)
+    for i in range(1, N + 1):
+        for j in range(M):
+            # correlated normals through the 2x2 Cholesky factor, drawn here
+            # unless a sampler pre-generated them as Z of shape (2, N, M)
+            if Z is None:
+                z_s = rng.standard_normal()
+                z_v = rho * z_s + rho_bar * rng.standard_normal()
+            else:
+                z_s = Z[0, i - 1, j]
+                z_v = rho * z_s + rho_bar * Z[1, i - 1, j]
+            v_pos = max(v[j], 0.0)
+            sqrt_v = np.sqrt(v_pos)
+            S[j] *= np.exp((r - 0.5 * v_pos) * dt + sqrt_v * sqrt_dt * z_s)
+            v[j] += kappa * (theta - v_pos) * dt + sigma * sqrt_v * sqrt_dt * z_v
+        if S_out is not None and i % save_every == 0:
+            k = i // save_every
+            S_out[k] = S
+            v_out[k] = np.maximum(v, 0.0)
+
+
+@njit(cache=True)
+def _heston_qe_kernel(
+    S, v, rho, kappa, theta, sigma, dt, r, N, save_every, rng, Z, S_out, v_out
+):
+    # Andersen's Quadratic-Exponential scheme: the variance is sampled from a
+    # moment-matched squared Gaussian (psi <= 1.5) or a point mass at zero
+    # mixed with an exponential, so it stays non-negative without truncation.
+    # log S uses the central discretization (gamma1 = gamma2 = 1/2) with the
+    # martingale correction, so that E[S_{t+dt} | S_t] = S_t exp(r dt).
+    M = S.shape[0]
+    psi_c = 1.5
+    exp_kdt = np.exp(-kappa * dt)
+    s2_v = sigma**2 * exp_kdt * (1.0 - exp_kdt) / kappa
+    s2_theta = theta * sigma**2 * (1.0 - exp_kdt) ** 2 / (2.0 * kappa)
+    K1 = 0.5 * dt * (kappa * rho / sigma - 0.5) - rho / sigma
+    K2 = 0.5 * dt * (kappa * rho / sigma - 0.5) + rho / sigma
+    K3 = 0.5 * dt * (1.0 - rho**2)
+    K4 = K3
+    A = K2 + 0.5 * K4
+    for i in range(1, N + 1):
+        for j in range(M):
+            if Z is None:
+                z_v = rng.standard_normal()
+                z_s = rng.standard_normal()
+            else:
+                z_s = Z[0, i - 1, j]
+                z_v = Z[1, i - 1, j]
+            v_j = v[j]
+            m = theta + (v_j - theta) * exp_kdt
+            psi = (v_j * s2_v + s2_theta) / m**2
+            if psi <= psi_c:
+                b2 = 2.0 / psi - 1.0 + np.sqrt(2.0 / psi) * np.sqrt(2.0 / psi - 1.0)
+                a = m / (1.0 + b2)
+                v_next = a * (np.sqrt(b2) + z_v) ** 2
+                K0 = -A * b2 * a / (1.0 - 2.0 * A * a) + 0.5 * np.log(1.0 - 2.0 * A * a)
+            else:
+                p = (psi - 1.0) / (psi + 1.0)
+                beta = (1.0 - p) / m
+                # the same normal drives the exponential branch as a uniform
+                u = 0.5 * math.erfc(-z_v / np.sqrt(2.0))
+                v_next = 0.0 if u <= p else np.log((1.0 - p) / (1.0 - u)) / beta
+                K0 = -np.log(p + beta * (1.0 - p) / (beta - A))
+            K0 -= (K1 + 0.5 * K3) * v_j
+            S[j] *= np.exp(
+                r * dt
+                + K0
+                + K1 * v_j
+                + K2 * v_next
+                + np.sqrt(K3 * v_j + K4 * v_next) * z_s
+            )
+            v[j] = v_next
+        if S_out is not None and i % save_every == 0:
+            k = i // save_every
+            S_out[k] = S
+            v_out[k] = v
+
+
+def heston_model_sim(
+    S0,
+    v0,
+    rho,
+    kappa,
+    theta,
+    sigma,
+    T,
+    N,
+    M,
+    r,
+    rng=None,
+    save_every=1,
+    terminal_only=False,
+    sampler="pseudo",
+    scheme="euler",
+):
     """
     Inputs:
      - S0, v0: initial parameters for asset and variance
@@ -53,33 +164,165 @@ def heston_model_sim(S0, v0, rho, kappa, theta, sigma, T, N, M, r):
      - T     : time of simulation
      - N     : number of time steps
      - M     : number of scenarios / simulations
+     - r     : risk-free rate
+     - rng   : numpy Generator or seed
+     - save_every    : store every save_every-th time step (must divide N)
+     - terminal_only : return only the values at T, using O(M) memory
+     - sampler : "pseudo", "antithetic", "sobol" or "moment_matching" (see
+       samplers.standard_normals); samplers other than "pseudo" pre-generate
+       all 2 * N * M normals
+     - scheme : "euler" (full-truncation Euler) or "qe" (Andersen's
+       Quadratic-Exponential scheme with martingale correction, accurate on
+       much coarser grids when the Feller condition fails)
 
     Outputs:
-    - asset prices over time (numpy array)
-    - variance over time (numpy array)
+    - asset prices over time (numpy array of shape (N // save_every + 1, M),
+      or (M,) if terminal_only)
+    - variance over time (numpy array, same shape)
     """
-    # initialise other parameters
+    if N % save_every != 0:
+        raise ValueError(f"save_every={save_every} must divide N={N}")
+    if scheme not in SCHEMES:
+        raise ValueError(f"Unknown scheme: {scheme}")
+    rng = np.random.default_rng(rng)
     dt = T / N
-    mu = np.array([0, 0])
-    cov = np.array([[1, rho], [rho, 1]])
-    # arrays for storing prices and variances
-    S = np.full(shape=(N + 1, M), fill_value=S0)
-    v = np.full(shape=(N + 1, M), fill_value=v0)
-    # sampling correlated brownian motions under risk-neutral measure
-    Z = np.random.multivariate_normal(mu, cov, (N, M))
-    for i in range(1, N + 1):
-        S[i] = S[i - 1] * np.exp(
-            (r - 0.5 * v[i - 1]) * dt + np.sqrt(v[i - 1] * dt) * Z[i - 1, :, 0]
-        )
-        v[i] = np.maximum(
-            v[i - 1]
-            + kappa * (theta - v[i - 1]) * dt
-            + sigma * np.sqrt(v[i - 1] * dt) * Z[i - 1, :, 1],
-            0,
+    # current state of every path, updated in place by the kernel
+    S = np.full(M, S0, dtype=np.float64)
+    v = np.full(M, v0, dtype=np.float64)
+    if terminal_only:
+        S_out, v_out = None, None
+    else:
+        S_out = np.empty((N // save_every + 1, M))
+        v_out = np.empty((N // save_every + 1, M))
+        S_out[0] = S
+        v_out[0] = v
+
+    Z = None
+    if sampler != "pseudo":
+        # one Brownian-bridged block per driving Brownian motion, time-major
+        Z = standard_normals(rng, M, (2, N), sampler)
+        Z = np.ascontiguousarray(np.moveaxis(Z, 0, -1))
+
+    kernel = _heston_qe_kernel if scheme == "qe" else _heston_kernel
+    kernel(S, v, rho, kappa, theta, sigma, dt, r, N, save_every, rng, Z, S_out, v_out)
+
+    if terminal_only:
+        return S, np.maximum(v, 0.0)
+    return S_out, v_out
+
+
+def heston_call_price(S0, v0, rho, kappa, theta, sigma, T, r, K):
+    """
+    Semi-analytic Heston price of a European call, from the characteristic
+    function in the formulation of Albrecher et al. (no branch-cut issues).
+    """
+
+    def char_fn(u):
+        iu = 1j * u
+        beta = kappa - rho * sigma * iu
+        d = np.sqrt(beta**2 + sigma**2 * (iu + u**2))
+        g = (beta - d) / (beta + d)
+        exp_dT = np.exp(-d * T)
+        C = r * iu * T + kappa * theta / sigma**2 * (
+            (beta - d) * T - 2 * np.log((1 - g * exp_dT) / (1 - g))
         )
+        D = (beta - d) / sigma**2 * (1 - exp_dT) / (1 - g * exp_dT)
+        return np.exp(C + D * v0 + iu * np.log(S0))
+
+    log_K = np.log(K)
+    forward = S0 * np.exp(r * T)
+
+    def p1_integrand(u):
+        return (np.exp(-1j * u * log_K) * char_fn(u - 1j) / (1j * u * forward)).real
 
-    return S, v
+    def p2_integrand(u):
+        return (np.exp(-1j * u * log_K) * char_fn(u) / (1j * u)).real
+
+    P1 = 0.5 + quad(p1_integrand, 0, np.inf, limit=500)[0] / np.pi
+    P2 = 0.5 + quad(p2_integrand, 0, np.inf, limit=500)[0] / np.pi
+    return S0 * P1 - K * np.exp(-r * T) * P2
+
+
+def convergence_check(
+    S0=100.0,
+    v0=0.25**2,
+    rho=-0.7,
+    kappa=3,
+    theta=0.20**2,
+    sigma=0.6,
+    T=1.0,
+    r=0.02,
+    strikes=(80.0, 100.0, 120.0),
+    step_counts=(4, 8, 16, 32, 64, 128, 256),
+    M=200000,
+    schemes=SCHEMES,
+    seed=0,
+):
+    """
+    Compares the discretization schemes across step counts by the error of
+    Monte Carlo call prices against the semi-analytic Heston prices, which
+    measures the bias of the simulated terminal distribution.
+
+    Returns:
+    - A list of dicts with the scheme, N, the largest absolute price error over
+      the strikes, its Monte Carlo standard error and the wall time.
+    """
+    strikes = np.asarray(strikes, dtype=float)
+    exact = np.array(
+        [heston_call_price(S0, v0, rho, kappa, theta, sigma, T, r, K) for K in strikes]
+    )
+    discount = np.exp(-r * T)
+    results = []
+    print(f"{'scheme':8s} {'N':>6s} {'max error':>12s} {'std error':>12s} {'time':>8s}")
+    for scheme in schemes:
+        # compile outside of the timed calls
+        heston_model_sim(S0, v0, rho, kappa, theta, sigma, T, 1, 1, r, scheme=scheme)
+        for N in step_counts:
+            start = time.perf_counter()
+            S_T, _ = heston_model_sim(
+                S0,
+                v0,
+                rho,
+                kappa,
+                theta,
+                sigma,
+                T,
+                N,
+                M,
+                r,
+                rng=seed,
+                terminal_only=True,
+                scheme=scheme,
+            )
+            wall_time = time.perf_counter() - start
+            payoffs = discount * np.maximum(S_T[:, None] - strikes, 0.0)
+            errors = np.abs(payoffs.mean(axis=0) - exact)
+            worst = errors.argmax()
+            result = {
+                "scheme": scheme,
+                "N": N,
+                "error": errors[worst],
+                "standard_error": payoffs[:, worst].std(ddof=1) / np.sqrt(M),
+                "time": wall_time,
+            }
+            results.append(result)
+            print(
+                f"{scheme:8s} {N:6d} {result['error']:12.5f} "
+                f"{result['standard_error']:12.5f} {wall_time:8.3f}s"
+            )
+    return results
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Simulate the Heston model.")
+    parser.add_argument(
+        "--convergence",
+        action="store_true",
+        help="Compare the Euler and QE schemes across step counts instead.",
+    )
+    parser.add_argument("-M", type=int, default=200000)
+    args = parser.parse_args()
+    if args.convergence:
+        convergence_check(M=args.M)
+    else:
+        main()
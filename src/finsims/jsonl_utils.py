@@ -1,25 +1,272 @@
 import json
+import os
+import zipfile
 from datetime import date
 
 import numpy as np
 
+SHARD_MANIFEST = "manifest.json"
+TSDIFF_START = str(date(2000, 1, 1))
 
-def save_dataset(filename, St, format_):
+
+DATASET_EXTENSIONS = {
+    "diffusionts": ".csv",
+    "tsdiff": ".jsonl",
+    "npy": ".npy",
+    "npz": ".npz",
+    "sharded": f"/{SHARD_MANIFEST}",
+}
+
+
+def dataset_path(filename, format_):
+    """The file save_dataset writes last for a dataset (the manifest if sharded)."""
+    return f"{filename}{DATASET_EXTENSIONS[format_]}"
+
+
+def save_dataset(filename, St, format_, shard_size=10000):
     if format_ == "diffusionts":
         np.savetxt(f"{filename}.csv", St, delimiter=",")
     elif format_ == "tsdiff":
-        dataset = []
-        for path in St.T:
-            dataset.append({"start": str(date(2000, 1, 1)), "target": list(path)})
-        with open(f"{filename}.jsonl", "w") as file:
-            for path in dataset:
-                file.write(json.dumps(path) + "\n")
+        with TsdiffWriter(f"{filename}.jsonl") as writer:
+            writer.append(St)
+    elif format_ == "npy":
+        np.save(f"{filename}.npy", St)
+    elif format_ == "npz":
+        np.savez_compressed(f"{filename}.npz", data=St)
+    elif format_ == "sharded":
+        writer = ShardedDatasetWriter(filename)
+        for start in range(0, St.shape[1], shard_size):
+            writer.append(St[:, start : start + shard_size])
+    else:
+        raise ValueError(f"Unknown dataset format: {format_}")
 
 
-def extract_targets_from_jsonl(file_path):
-    targets = []
+def load_dataset(filename, format_, mmap_mode=None):
+    """
+    Loads a dataset written by save_dataset as an array of shape (n, M).
+
+    Args:
+        filename: The dataset name without extension, as passed to save_dataset.
+        format_: The format the dataset was saved in.
+        mmap_mode: Memory-map mode for the npy and sharded formats.
+    """
+    if format_ == "diffusionts":
+        return np.loadtxt(f"{filename}.csv", delimiter=",", ndmin=2)
+    elif format_ == "tsdiff":
+        return extract_targets_from_jsonl(f"{filename}.jsonl")
+    elif format_ == "npy":
+        return np.load(f"{filename}.npy", mmap_mode=mmap_mode)
+    elif format_ == "npz":
+        with np.load(f"{filename}.npz") as data:
+            return data["data"]
+    elif format_ == "sharded":
+        return load_sharded(filename, mmap_mode=mmap_mode)
+    raise ValueError(f"Unknown dataset format: {format_}")
+
+
+def dataset_files(filename, format_):
+    """All files of a dataset saved by save_dataset (the manifest first if sharded)."""
+    path = dataset_path(filename, format_)
+    if format_ != "sharded":
+        return [path]
+    manifest = read_shard_manifest(filename)
+    return [path] + [os.path.join(filename, s["file"]) for s in manifest["shards"]]
+
+
+def dataset_info(filename, format_):
+    """
+    Reads the shape (n, M) and dtype of a dataset saved by save_dataset without
+    loading it.
+
+    Returns:
+        (shape, dtype): A tuple of ints and the dtype name.
+    """
+    path = dataset_path(filename, format_)
+    if format_ == "npy":
+        data = np.load(path, mmap_mode="r")
+        return data.shape, str(data.dtype)
+    if format_ == "npz":
+        with zipfile.ZipFile(path) as archive, archive.open("data.npy") as f:
+            if np.lib.format.read_magic(f) == (1, 0):
+                shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, _, dtype = np.lib.format.read_array_header_2_0(f)
+        return shape, str(dtype)
+    if format_ == "sharded":
+        manifest = read_shard_manifest(filename)
+        return tuple(manifest["shape"]), manifest["dtype"]
+    if format_ == "diffusionts":
+        with open(path, "r") as f:
+            n_cols = f.readline().count(",") + 1
+        return (_count_lines(path), n_cols), "float64"
+    if format_ == "tsdiff":
+        with open(path, "r") as f:
+            n = len(json.loads(f.readline())["target"])
+        return (n, _count_lines(path)), "float64"
+    raise ValueError(f"Unknown dataset format: {format_}")
+
+
+class ShardedDatasetWriter:
+    """
+    Writes a dataset of shape (n, M) as a directory of .npy shards split along M.
+
+    Shards are appended as they are produced. The manifest is rewritten
+    atomically after every shard, so a reader always sees complete shards.
+    """
+
+    def __init__(self, dirname):
+        self.dirname = dirname
+        self.shards = []
+        self.n = None
+        self.dtype = None
+        self.M = 0
+        os.makedirs(dirname, exist_ok=True)
+
+    def append(self, block):
+        block = np.asarray(block)
+        if self.n is None:
+            self.n, self.dtype = block.shape[0], block.dtype
+        elif block.shape[0] != self.n:
+            raise ValueError(
+                f"Expected shards with {self.n} rows, got {block.shape[0]}"
+            )
+        file = f"shard-{len(self.shards):05d}.npy"
+        np.save(os.path.join(self.dirname, file), block.astype(self.dtype, copy=False))
+        self.shards.append(
+            {"file": file, "start": self.M, "stop": self.M + block.shape[1]}
+        )
+        self.M += block.shape[1]
+        self._write_manifest()
+
+    def _write_manifest(self):
+        manifest = {
+            "shape": [self.n, self.M],
+            "dtype": str(self.dtype),
+            "shards": self.shards,
+        }
+        manifest_f = os.path.join(self.dirname, SHARD_MANIFEST)
+        with open(f"{manifest_f}.tmp", "w") as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(f"{manifest_f}.tmp", manifest_f)
+
+
+def read_shard_manifest(dirname):
+    with open(os.path.join(dirname, SHARD_MANIFEST), "r") as f:
+        return json.load(f)
+
+
+def load_sharded(dirname, start=0, stop=None, mmap_mode=None):
+    """
+    Loads paths start:stop of a sharded dataset, reading only the shards that
+    overlap the requested range.
+    """
+    manifest = read_shard_manifest(dirname)
+    n, M = manifest["shape"]
+    stop = M if stop is None else min(stop, M)
+    blocks = []
+    for shard in manifest["shards"]:
+        if shard["stop"] <= start or shard["start"] >= stop:
+            continue
+        data = np.load(os.path.join(dirname, shard["file"]), mmap_mode=mmap_mode)
+        lo = max(start - shard["start"], 0)
+        hi = min(stop, shard["stop"]) - shard["start"]
+        blocks.append(data[:, lo:hi])
+    if not blocks:
+        return np.empty((n, 0), dtype=manifest["dtype"])
+    if len(blocks) == 1:
+        return blocks[0]
+    return np.concatenate(blocks, axis=1)
+
+
+class TsdiffWriter:
+    """
+    Streams paths of shape (n, M) blocks to a tsdiff JSON lines file.
+
+    Each line is formatted straight from the array row and lines are written
+    in batches. The output is byte-identical to
+    json.dumps({"start": ..., "target": list(path)}).
+    """
+
+    def __init__(self, file_path, batch_size=1000):
+        self.file = open(file_path, "w", buffering=1 << 20)
+        self.batch_size = batch_size
+        self.prefix = f'{{"start": "{TSDIFF_START}", "target": '
+
+    def append(self, block):
+        for start in range(0, block.shape[1], self.batch_size):
+            rows = block[:, start : start + self.batch_size].T.tolist()
+            self.file.write(
+                "".join(f"{self.prefix}{json.dumps(row)}}}\n" for row in rows)
+            )
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def _count_lines(file_path):
+    count = 0
+    with open(file_path, "rb") as file:
+        while chunk := file.read(1 << 24):
+            count += chunk.count(b"\n")
+    return count
+
+
+def read_tsdiff(file_path, start=0, stop=None, time_slice=None, dtype=np.float64):
+    """
+    Reads paths start:stop of a tsdiff JSON lines file into a preallocated
+    array of shape (n, stop - start).
+
+    Args:
+        file_path: The .jsonl file written by save_dataset.
+        start, stop: The range of paths (lines) to read; stop=K reads the first K.
+        time_slice: Optional slice of time steps to keep from every path.
+        dtype: The dtype of the returned array.
+    """
+    time_slice = slice(None) if time_slice is None else time_slice
+    if stop is None:
+        stop = _count_lines(file_path)
+    targets = None
+    count = 0
+    with open(file_path, "r") as file:
+        for j, line in enumerate(file):
+            if j < start:
+                continue
+            if j >= stop:
+                break
+            target = json.loads(line)["target"][time_slice]
+            if targets is None:
+                targets = np.empty((len(target), stop - start), dtype=dtype)
+            targets[:, count] = target
+            count += 1
+    if targets is None:
+        return np.empty((0, 0), dtype=dtype)
+    # the file may hold fewer paths than requested
+    return targets[:, :count]
+
+
+def iter_tsdiff_batches(file_path, batch_size=1000, time_slice=None, dtype=np.float64):
+    """
+    Yields consecutive batches of paths from a tsdiff JSON lines file as arrays
+    of shape (n, batch_size); the last batch may be narrower.
+    """
+    time_slice = slice(None) if time_slice is None else time_slice
+    batch = []
     with open(file_path, "r") as file:
         for line in file:
-            data = json.loads(line)
-            targets.append(data["target"])
-    return np.array(targets).T
+            batch.append(json.loads(line)["target"][time_slice])
+            if len(batch) == batch_size:
+                yield np.array(batch, dtype=dtype).T
+                batch = []
+    if batch:
+        yield np.array(batch, dtype=dtype).T
+
+
+def extract_targets_from_jsonl(file_path):
+    return read_tsdiff(file_path)
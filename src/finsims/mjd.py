@@ -1,7 +1,22 @@
 import numpy as np
-
-
-def simulate_merton_jump_diffusion(mu, sigma, lamb, mu_j, sigma_j, n, M, dt, s0=None):
+from samplers import standard_normals
+
+
+def simulate_merton_jump_diffusion(
+    mu,
+    sigma,
+    lamb,
+    mu_j,
+    sigma_j,
+    n,
+    M,
+    dt,
+    s0=None,
+    rng=None,
+    dtype=np.float64,
+    common_random_numbers=False,
+    sampler="pseudo",
+):
     """
     Simulate the Merton Jump Diffusion model.
 
@@ -15,75 +30,125 @@ def simulate_merton_jump_diffusion(mu, sigma, lamb, mu_j, sigma_j, n, M, dt, s0=
     - M: Number of simulation paths.
     - dt: Time step size.
     - s0: Initial asset price (defaults to 1 if None).
+    - rng: numpy Generator or seed.
+    - dtype: Output dtype (np.float64 or np.float32).
+    - common_random_numbers: With array parameters, reuse the same diffusion
+      increments for every parameter set (jumps are drawn per set).
+    - sampler: How the diffusion increments are sampled: "pseudo",
+      "antithetic", "sobol" or "moment_matching" (see
+      samplers.standard_normals). Jumps are always pseudo-random.
+
+    The model parameters may be arrays of P parameter sets, in which case the
+    whole grid is simulated in one call.
 
     Returns:
-    - St: Simulated asset prices (array of shape (n+1, M)).
+    - St: Simulated asset prices (array of shape (n+1, M), or (P, n+1, M) for
+      array parameters).
     """
     if s0 is None:
         s0 = 1
+    rng = np.random.default_rng(rng)
+    batch_shape = np.broadcast(mu, sigma, lamb, mu_j, sigma_j).shape
+    if batch_shape:
+        # one parameter set per leading index, broadcast over (n, M)
+        mu, sigma, lamb, mu_j, sigma_j = (
+            np.reshape(np.broadcast_to(p, batch_shape), batch_shape + (1, 1))
+            for p in (mu, sigma, lamb, mu_j, sigma_j)
+        )
 
     # Precompute constants
     k = np.exp(mu_j + 0.5 * sigma_j**2) - 1  # Expected jump size
     drift = (mu - lamb * k - 0.5 * sigma**2) * dt
 
-    # Initialize asset prices array
-    St = np.zeros((n + 1, M))
-    St[0] = s0
-
-    for i in range(1, n + 1):
-        # Simulate Poisson jumps
-        N_t = np.random.poisson(lamb * dt, M)
-        # Simulate jump sizes
-        J_t = np.random.normal(mu_j, sigma_j, (M,)) * N_t
-        # Simulate diffusion component
-        diffusion = drift + sigma * np.sqrt(dt) * np.random.normal(0, 1, M)
-        # Update asset prices
-        St[i] = St[i - 1] * np.exp(diffusion + J_t)
+    # Simulate Poisson jump counts and diffusion increments for the whole grid
+    N_t = rng.poisson(lamb * dt, size=batch_shape + (n, M))
+    noise_shape = () if common_random_numbers else batch_shape
+    if sampler == "pseudo":
+        Z = rng.standard_normal(size=noise_shape + (n, M), dtype=dtype)
+    else:
+        # samplers draw path-major, viewed here as (..., n, M)
+        Z = standard_normals(rng, M, noise_shape + (n,), sampler, dtype)
+        Z = np.moveaxis(Z, 0, -1)
+    if batch_shape and common_random_numbers:
+        log_increments = np.multiply(Z, sigma * np.sqrt(dt), dtype=dtype)
+    else:
+        log_increments = Z
+        log_increments *= sigma * np.sqrt(dt)
+    log_increments += drift
+
+    # The sum of N normal jump sizes is N(N * mu_j, N * sigma_j^2); jumps are
+    # sparse, so only the steps with at least one jump are sampled
+    jump_steps = np.nonzero(N_t)
+    N_jumps = N_t[jump_steps]
+    mu_j = np.broadcast_to(mu_j, N_t.shape)[jump_steps]
+    sigma_j = np.broadcast_to(sigma_j, N_t.shape)[jump_steps]
+    log_increments[jump_steps] += rng.normal(N_jumps * mu_j, np.sqrt(N_jumps) * sigma_j)
+
+    # Build log-prices with a single cumulative sum along time
+    St = np.empty(batch_shape + (n + 1, M), dtype=dtype)
+    St[..., 0, :] = 0
+    np.cumsum(log_increments, axis=-2, out=St[..., 1:, :])
+    np.exp(St, out=St)
+    St *= s0
 
     return St
 
 
-def estimate_mjd_parameters(series, dt, threshold=3):
+def _masked_mean_std(values, mask, count):
+    # mean and (ddof=0) std over axis 0 restricted to mask; 0 where count is 0
+    safe_count = np.maximum(count, 1)
+    mean = np.where(mask, values, 0).sum(axis=0) / safe_count
+    var = np.where(mask, (values - mean) ** 2, 0).sum(axis=0) / safe_count
+    return mean, np.sqrt(var)
+
+
+def estimate_mjd_parameters_batch(series, dt, threshold=3, max_iter=1):
     """
-    Estimate parameters of the Merton Jump Diffusion model from a price series.
+    Estimate Merton Jump Diffusion parameters for many price paths at once.
 
     Parameters:
-    - series: Time series of asset prices.
+    - series: Asset prices (array of shape (n+1, M)).
     - dt: Time step size.
     - threshold: Threshold (in standard deviations) to identify jumps.
+    - max_iter: Number of classification passes. The first pass thresholds
+      against the statistics of all returns; later passes re-threshold against
+      the statistics of the returns classified as diffusion, stopping early
+      once no path changes its classification.
 
     Returns:
-    - params: Dictionary containing estimated parameters.
+    - params: Dictionary of per-path parameter arrays (NaN where mu_j or
+      sigma_j cannot be estimated).
+    - aggregate: Dictionary of the parameters averaged over paths.
     """
     # Calculate log returns
-    log_returns = np.diff(np.log(series))
-    n = len(log_returns)
+    log_returns = np.diff(np.log(series), axis=0)
+    n = log_returns.shape[0]
 
     # Calculate statistics of log returns
-    mu_hat = np.mean(log_returns)
-    sigma_hat = np.std(log_returns)
-
-    # Identify jumps
-    jump_indices = np.where(np.abs(log_returns - mu_hat) > threshold * sigma_hat)[0]
-    no_jump_indices = np.where(np.abs(log_returns - mu_hat) <= threshold * sigma_hat)[0]
-
-    # Estimate jump intensity (lambda)
-    lamb_hat = len(jump_indices) / (n * dt)
-
-    # Estimate jump sizes
-    if len(jump_indices) > 0:
-        jump_sizes = log_returns[jump_indices]
-        mu_j_hat = np.mean(jump_sizes)
-        sigma_j_hat = np.std(jump_sizes)
-    else:
-        mu_j_hat = 0
-        sigma_j_hat = 0
+    center = log_returns.mean(axis=0)
+    scale = log_returns.std(axis=0)
+
+    jumps = None
+    for _ in range(max_iter):
+        # Identify jumps
+        new_jumps = np.abs(log_returns - center) > threshold * scale
+        if jumps is not None and np.array_equal(new_jumps, jumps):
+            break
+        jumps = new_jumps
+        n_diffusion = n - jumps.sum(axis=0)
+        center, scale = _masked_mean_std(log_returns, ~jumps, n_diffusion)
+
+    n_jumps = jumps.sum(axis=0)
+    n_diffusion = n - n_jumps
+
+    # Estimate jump intensity (lambda) and jump sizes
+    lamb_hat = n_jumps / (n * dt)
+    mu_j_hat, sigma_j_hat = _masked_mean_std(log_returns, jumps, n_jumps)
 
-    # Adjusted drift estimation
     # Remove jumps to estimate diffusion component
-    diffusion_returns = log_returns[no_jump_indices]
-    mu_diffusion_hat = np.mean(diffusion_returns) / dt
-    sigma_diffusion_hat = np.std(diffusion_returns) / np.sqrt(dt)
+    mu_diffusion, sigma_diffusion = _masked_mean_std(log_returns, ~jumps, n_diffusion)
+    mu_diffusion_hat = mu_diffusion / dt
+    sigma_diffusion_hat = sigma_diffusion / np.sqrt(dt)
 
     # Adjust drift for jump component
     k_hat = np.exp(mu_j_hat + 0.5 * sigma_j_hat**2) - 1
@@ -93,8 +158,37 @@ def estimate_mjd_parameters(series, dt, threshold=3):
         "mu": mu_hat_adj,
         "sigma": sigma_diffusion_hat,
         "lamb": lamb_hat,
-        "mu_j": None if len(jump_indices) == 0 else mu_j_hat,
-        "sigma_j": None if len(jump_indices) <= 1 else sigma_j_hat,
+        "mu_j": np.where(n_jumps == 0, np.nan, mu_j_hat),
+        "sigma_j": np.where(n_jumps <= 1, np.nan, sigma_j_hat),
     }
+    # paths without (enough) jumps have no mu_j or sigma_j; if no path has
+    # them the aggregate is NaN too
+    aggregate = {
+        name: np.nan if np.isnan(values).all() else np.nanmean(values)
+        for name, values in params.items()
+    }
+
+    return params, aggregate
+
+
+def estimate_mjd_parameters(series, dt, threshold=3):
+    """
+    Estimate parameters of the Merton Jump Diffusion model from a price series.
+
+    Parameters:
+    - series: Time series of asset prices.
+    - dt: Time step size.
+    - threshold: Threshold (in standard deviations) to identify jumps.
+
+    Returns:
+    - params: Dictionary containing estimated parameters.
+    """
+    batch_params, _ = estimate_mjd_parameters_batch(
+        np.asarray(series)[:, None], dt, threshold
+    )
+    params = {name: values[0] for name, values in batch_params.items()}
+    for name in ("mu_j", "sigma_j"):
+        if np.isnan(params[name]):
+            params[name] = None
 
     return params
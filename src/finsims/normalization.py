@@ -0,0 +1,146 @@
+import numpy as np
+from jsonl_utils import read_shard_manifest
+
+ZSCORE_MODES = ("path", "timestep")
+
+
+class StreamingZScore:
+    """
+    Z-score normalization of datasets of shape (n, M) fitted over streamed
+    blocks of paths, as produced by simulate_gbm_chunks or stored as shards.
+
+    In "path" mode every path is normalized by its own mean and std over time;
+    each block holds whole paths, so their vectors are appended. In "timestep"
+    mode every time step is normalized by its mean and std across all paths;
+    the blocks are combined with Welford/Chan parallel-merge updates, so the
+    result equals the statistics of the whole matrix without ever holding it.
+
+    Args:
+        mode: "path" or "timestep".
+    """
+
+    def __init__(self, mode="path"):
+        if mode not in ZSCORE_MODES:
+            raise ValueError(f"Unknown z-score mode: {mode}")
+        self.mode = mode
+        self.count = 0
+        self.mean = None
+        self._m2 = None
+
+    def update(self, block):
+        """Accumulates the statistics of a block of paths of shape (n, width)."""
+        block = np.asarray(block)
+        axis = 0 if self.mode == "path" else 1
+        other = StreamingZScore(self.mode)
+        other.count = block.shape[axis]
+        other.mean = block.mean(axis=axis)
+        other._m2 = block.var(axis=axis) * other.count
+        return self.merge(other)
+
+    def merge(self, other):
+        """
+        Combines the statistics of the paths following this accumulator's, e.g.
+        as accumulated by another worker.
+        """
+        if other.mean is None:
+            return self
+        if self.mean is None:
+            self.count, self.mean, self._m2 = other.count, other.mean, other._m2
+        elif self.mode == "path":
+            self.mean = np.concatenate([self.mean, other.mean])
+            self._m2 = np.concatenate([self._m2, other._m2])
+        else:
+            # Chan et al.'s pairwise update of the counts, means and M2 sums
+            total = self.count + other.count
+            delta = other.mean - self.mean
+            self.mean = self.mean + delta * (other.count / total)
+            self._m2 = (
+                self._m2 + other._m2 + delta**2 * (self.count * other.count / total)
+            )
+            self.count = total
+        return self
+
+    @property
+    def std(self):
+        return np.sqrt(self._m2 / self.count)
+
+    def _scale(self):
+        # constant rows or paths (e.g. the first step of paths started at s0)
+        # are only centered
+        std = self.std
+        return np.where(std > 0, std, 1.0)
+
+    def _broadcast(self, vector, start, width):
+        if self.mode == "path":
+            return vector[start : start + width]
+        return vector[:, np.newaxis]
+
+    def apply(self, block, start=0):
+        """
+        Normalizes a block of paths in place.
+
+        Args:
+            block: A float array of shape (n, width).
+            start: The index of the block's first path (path mode only).
+        """
+        width = block.shape[1]
+        block -= self._broadcast(self.mean, start, width)
+        block /= self._broadcast(self._scale(), start, width)
+        return block
+
+    def invert(self, block, start=0):
+        """Undoes apply in place."""
+        width = block.shape[1]
+        block *= self._broadcast(self._scale(), start, width)
+        block += self._broadcast(self.mean, start, width)
+        return block
+
+    def summary(self):
+        """The averaged mean and std, as stored in the zscore params JSON files."""
+        return {"mean": self.mean.mean(), "std": self.std.mean()}
+
+    def save(self, path):
+        """Writes the full mean and std vectors to a binary .npz sidecar."""
+        np.savez(path, mode=self.mode, count=self.count, mean=self.mean, std=self.std)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            zscore = cls(str(data["mode"]))
+            zscore.count = int(data["count"])
+            zscore.mean = data["mean"]
+            zscore._m2 = data["std"] ** 2 * zscore.count
+        return zscore
+
+
+def fit_zscore(blocks, mode="path"):
+    """Fits a StreamingZScore over an iterable of (n, width) blocks."""
+    zscore = StreamingZScore(mode)
+    for block in blocks:
+        zscore.update(block)
+    return zscore
+
+
+def zscore_sharded(dirname, mode="path", sidecar=None):
+    """
+    Normalizes a sharded dataset in place with two passes over the memory-mapped
+    shards, so only one shard is resident at a time.
+
+    Args:
+        dirname: The sharded dataset directory.
+        mode: "path" or "timestep".
+        sidecar: The .npz file receiving the parameters (default
+         <dirname>/zscore-params.npz).
+
+    Returns:
+        The fitted StreamingZScore.
+    """
+    manifest = read_shard_manifest(dirname)
+    paths = [f"{dirname}/{shard['file']}" for shard in manifest["shards"]]
+    zscore = fit_zscore((np.load(path, mmap_mode="r") for path in paths), mode)
+    for path, shard in zip(paths, manifest["shards"]):
+        block = np.load(path, mmap_mode="r+")
+        zscore.apply(block, shard["start"])
+        block.flush()
+    zscore.save(sidecar or f"{dirname}/zscore-params.npz")
+    return zscore
@@ -0,0 +1,166 @@
+import numpy as np
+from scipy.stats import norm
+
+OPTION_KINDS = ("call", "put")
+
+
+def maturity_rows(maturities, dt, n_rows):
+    """Row indices of the maturities in a price matrix sampled every dt."""
+    rows = np.rint(np.asarray(maturities, dtype=float) / dt).astype(int)
+    if np.any(rows < 1) or np.any(rows >= n_rows):
+        raise ValueError(
+            f"Maturities must lie in (0, {(n_rows - 1) * dt}] on the grid of the paths"
+        )
+    if not np.allclose(rows * dt, maturities):
+        raise ValueError("Maturities must be multiples of the time step dt")
+    return rows
+
+
+def _payoffs(S_T, strikes, kind):
+    # (maturities, 1, paths) against (1, strikes, 1): one broadcasted payoff
+    # array of shape (maturities, strikes, paths)
+    intrinsic = S_T[:, np.newaxis, :] - strikes[np.newaxis, :, np.newaxis]
+    if kind == "put":
+        np.negative(intrinsic, out=intrinsic)
+    return np.maximum(intrinsic, 0.0, out=intrinsic)
+
+
+def mc_option_prices(
+    paths,
+    dt,
+    strikes,
+    maturities,
+    r,
+    kind="call",
+    sampler="pseudo",
+    chunk_size=10000,
+):
+    """
+    Monte Carlo prices of European options over a grid of strikes and
+    maturities from risk-neutral price paths.
+
+    Parameters:
+    - paths: Simulated prices (array of shape (n+1, M)) starting at s0, e.g. from
+      simulate_gbm(..., s0=s0) with mu = r, heston_model_sim or
+      simulate_merton_jump_diffusion.
+    - dt: The time between the rows of paths (T / N * save_every for Heston).
+    - strikes: The strikes (1D array).
+    - maturities: The maturities in years (1D array), multiples of dt.
+    - r: The risk-free rate used for discounting.
+    - kind: "call" or "put".
+    - sampler: The sampler the paths were simulated with; "antithetic" pairs
+      path i with path i + M/2 for the standard errors.
+    - chunk_size: The number of paths (or antithetic pairs) reduced at once,
+      bounding the payoff array at maturities x strikes x chunk_size.
+
+    Returns:
+    - prices, standard_errors: Arrays of shape (maturities, strikes).
+    """
+    if kind not in OPTION_KINDS:
+        raise ValueError(f"Unknown option kind: {kind}")
+    strikes = np.asarray(strikes, dtype=float)
+    maturities = np.asarray(maturities, dtype=float)
+    rows = maturity_rows(maturities, dt, paths.shape[0])
+    M = paths.shape[1]
+    count = M // 2 if sampler == "antithetic" else M
+
+    total = np.zeros((len(maturities), len(strikes)))
+    total_sq = np.zeros_like(total)
+    for start in range(0, count, chunk_size):
+        stop = min(start + chunk_size, count)
+        payoffs = _payoffs(paths[rows, start:stop], strikes, kind)
+        if sampler == "antithetic":
+            payoffs += _payoffs(
+                paths[rows, count + start : count + stop], strikes, kind
+            )
+            payoffs *= 0.5
+        total += payoffs.sum(axis=-1)
+        total_sq += (payoffs**2).sum(axis=-1)
+
+    mean = total / count
+    variance = (total_sq - count * mean**2) / (count - 1)
+    discount = np.exp(-r * maturities)[:, np.newaxis]
+    prices = discount * mean
+    standard_errors = discount * np.sqrt(np.maximum(variance, 0.0) / count)
+    return prices, standard_errors
+
+
+def black_scholes_price(s0, strikes, maturities, r, sigma, kind="call", q=0.0):
+    """Black-Scholes-Merton prices, broadcasting over all arguments."""
+    sqrt_T = np.sqrt(maturities)
+    d1 = (np.log(s0 / strikes) + (r - q + 0.5 * sigma**2) * maturities) / (
+        sigma * sqrt_T
+    )
+    d2 = d1 - sigma * sqrt_T
+    forward = s0 * np.exp(-q * maturities)
+    discounted_strikes = strikes * np.exp(-r * maturities)
+    if kind == "call":
+        return forward * norm.cdf(d1) - discounted_strikes * norm.cdf(d2)
+    return discounted_strikes * norm.cdf(-d2) - forward * norm.cdf(-d1)
+
+
+def _bisection_implied_vol(
+    prices, s0, K, T, r, kind, q, bracket=(1e-6, 5.0), iterations=60
+):
+    # Black-Scholes prices increase with sigma, so one bisection over the whole
+    # grid converges for every option at once
+    low = np.full(prices.shape, bracket[0])
+    high = np.full(prices.shape, bracket[1])
+    for _ in range(iterations):
+        mid = 0.5 * (low + high)
+        above = black_scholes_price(s0, K, T, r, mid, kind, q) > prices
+        high = np.where(above, mid, high)
+        low = np.where(above, low, mid)
+    # prices outside the bracket (e.g. below intrinsic) have no implied vol
+    lower = black_scholes_price(s0, K, T, r, bracket[0], kind, q)
+    upper = black_scholes_price(s0, K, T, r, bracket[1], kind, q)
+    valid = (prices > lower) & (prices < upper)
+    return np.where(valid, 0.5 * (low + high), np.nan)
+
+
+def implied_vol_surface(
+    prices, s0, strikes, maturities, r, kind="call", q=0.0, solver="vollib"
+):
+    """
+    Inverts a grid of option prices to Black-Scholes implied volatilities in
+    one vectorized call.
+
+    Parameters:
+    - prices: Option prices (array of shape (maturities, strikes)), e.g. from
+      mc_option_prices.
+    - s0: The spot price.
+    - strikes, maturities: The grid of the prices.
+    - r: The risk-free rate.
+    - kind: "call" or "put".
+    - q: The dividend yield.
+    - solver: "vollib" (py_vollib_vectorized, Let's Be Rational) or
+      "bisection" (numpy only).
+
+    Returns:
+    - Implied volatilities (array of shape (maturities, strikes)), NaN where
+      a price violates the no-arbitrage bounds.
+    """
+    prices = np.asarray(prices, dtype=float)
+    K, T = np.meshgrid(
+        np.asarray(strikes, dtype=float), np.asarray(maturities, dtype=float)
+    )
+    if solver == "bisection":
+        return _bisection_implied_vol(prices, s0, K, T, r, kind, q)
+    if solver != "vollib":
+        raise ValueError(f"Unknown implied volatility solver: {solver}")
+
+    import py_vollib_vectorized
+
+    implied = py_vollib_vectorized.vectorized_implied_volatility(
+        prices.ravel(),
+        s0,
+        K.ravel(),
+        T.ravel(),
+        r,
+        "c" if kind == "call" else "p",
+        q=q,
+        model="black_scholes_merton",
+        return_as="numpy",
+        on_error="ignore",
+    )
+    return np.asarray(implied, dtype=float).reshape(prices.shape)
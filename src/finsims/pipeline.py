@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+def output_signature(path):
+    """The size and modification time of a file, or None if it is missing."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class Node:
+    def __init__(self, name, fn, inputs=(), outputs=(), key=None, io=False):
+        self.name = name
+        self.fn = fn
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.key = key
+        self.io = io
+
+
+class Pipeline:
+    """
+    A small lazy DAG of named nodes.
+
+    Nodes without outputs compute in-memory values; they run at most once and
+    only when a node that needs them runs. Nodes with outputs write files; they
+    run only when a file is missing or the node is stale, i.e. its key or the
+    key of anything upstream changed since the last recorded run, or one of
+    its files was replaced since this pipeline wrote it (detected from the
+    size and modification time recorded with the digest). Nodes marked
+    io run on a thread pool so that writing overlaps with further compute,
+    except under a profiler, whose measurements must not overlap.
+
+    Args:
+        state_path: The JSON file recording the digests of completed nodes.
+        io_workers: The number of threads used by io nodes.
+        profiler: An optional StageProfiler measuring every node that runs.
+    """
+
+    def __init__(self, state_path, io_workers=4, profiler=None):
+        self.state_path = state_path
+        self.io_workers = io_workers
+        self.profiler = profiler
+        self.nodes = {}
+
+    def add(self, name, fn, inputs=(), outputs=(), key=None, io=False):
+        """
+        Adds a node calling fn(*values of inputs).
+
+        Args:
+            name: The unique node name.
+            fn: The function computing the node value or writing its outputs.
+            inputs: The names of the nodes whose values fn takes.
+            outputs: The files the node writes.
+            key: A JSON-serializable description of everything besides the inputs
+             that determines the node result (parameters, seed, format, ...).
+            io: Run the node on the I/O thread pool.
+        """
+        if name in self.nodes:
+            raise ValueError(f"Duplicate pipeline node: {name}")
+        self.nodes[name] = Node(name, fn, inputs, outputs, key, io)
+
+    def digest(self, name, _memo=None):
+        memo = {} if _memo is None else _memo
+        if name not in memo:
+            node = self.nodes[name]
+            payload = {
+                "name": name,
+                "key": node.key,
+                "inputs": [self.digest(input_, memo) for input_ in node.inputs],
+            }
+            payload = json.dumps(payload, sort_keys=True, default=str)
+            memo[name] = hashlib.sha256(payload.encode()).hexdigest()
+        return memo[name]
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_state(self, state):
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        with open(f"{self.state_path}.tmp", "w") as f:
+            json.dump(state, f, indent=4)
+        os.replace(f"{self.state_path}.tmp", self.state_path)
+
+    def _record(self, state, name):
+        state[name] = {
+            "digest": self.digest(name),
+            "outputs": {
+                output: output_signature(output) for output in self.nodes[name].outputs
+            },
+        }
+
+    def _is_fresh(self, record, name, memo):
+        # records of older versions are bare digests without output signatures
+        if not isinstance(record, dict) or record["digest"] != self.digest(name, memo):
+            return False
+        for output in self.nodes[name].outputs:
+            signature = output_signature(output)
+            if signature is None or signature != record["outputs"].get(output):
+                return False
+        return True
+
+    def stale_nodes(self):
+        state = self._load_state()
+        memo = {}
+        return [
+            name
+            for name, node in self.nodes.items()
+            if node.outputs and not self._is_fresh(state.get(name), name, memo)
+        ]
+
+    def _call(self, node, args):
+        if self.profiler is None:
+            return node.fn(*args)
+        return self.profiler.measure(node.name, node.fn, args, node.outputs)
+
+    def run(self):
+        """
+        Runs every stale output node and the value nodes it depends on.
+
+        Returns:
+            The names of the nodes that ran.
+        """
+        state = self._load_state()
+        values = {}
+
+        def value(name):
+            if name not in values:
+                node = self.nodes[name]
+                values[name] = self._call(node, [value(i) for i in node.inputs])
+            return values[name]
+
+        stale = self.stale_nodes()
+        futures = {}
+        with ThreadPoolExecutor(max_workers=self.io_workers) as executor:
+            try:
+                for name in stale:
+                    node = self.nodes[name]
+                    args = [value(input_) for input_ in node.inputs]
+                    if node.io and self.profiler is None:
+                        futures[name] = executor.submit(self._call, node, args)
+                    else:
+                        self._call(node, args)
+                        self._record(state, name)
+                for name, future in futures.items():
+                    future.result()
+                    self._record(state, name)
+            finally:
+                # record whatever completed, so a rerun only repeats the rest
+                for name, future in futures.items():
+                    if future.done() and future.exception() is None:
+                        self._record(state, name)
+                self._save_state(state)
+        return stale
@@ -0,0 +1,138 @@
+import csv
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+
+class PriceSource:
+    """
+    Interface of daily adjusted close price sources.
+
+    fetch(symbol, start) returns (dates, prices): a datetime64[D] array and a
+    float64 array of the prices on or after start (all history if start is None).
+    """
+
+    def fetch(self, symbol, start=None):
+        raise NotImplementedError
+
+
+class YFinanceSource(PriceSource):
+    def fetch(self, symbol, start=None):
+        import yfinance as yf
+
+        if start is None:
+            data = yf.download(symbol, period="max", auto_adjust=False, progress=False)
+        else:
+            data = yf.download(
+                symbol, start=str(start), auto_adjust=False, progress=False
+            )
+        prices = data["Adj Close"]
+        if prices.ndim > 1:
+            # newer yfinance versions return one column per ticker
+            prices = prices.iloc[:, 0]
+        prices = prices.dropna()
+        return prices.index.values.astype("datetime64[D]"), prices.to_numpy(float)
+
+
+class CSVDirectorySource(PriceSource):
+    """
+    Reads {directory}/{symbol}.csv files with a Date column and an Adj Close
+    (or Close) column, e.g. as exported by yfinance. Stands in for the network
+    in tests and air-gapped runs.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def fetch(self, symbol, start=None):
+        path = os.path.join(self.directory, f"{symbol}.csv")
+        with open(path, "r", newline="") as f:
+            rows = list(csv.DictReader(f))
+        price_col = "Adj Close" if rows and "Adj Close" in rows[0] else "Close"
+        rows = [row for row in rows if row[price_col] not in ("", "null", "nan")]
+        dates = np.array([row["Date"][:10] for row in rows], dtype="datetime64[D]")
+        prices = np.array([row[price_col] for row in rows], dtype=float)
+        if start is not None:
+            keep = dates >= np.datetime64(start, "D")
+            dates, prices = dates[keep], prices[keep]
+        return dates, prices
+
+
+class PriceStore:
+    """
+    A local store of daily prices with one columnar .npz file (dates and
+    prices columns) per symbol.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, symbol):
+        return os.path.join(self.root, f"{symbol}.npz")
+
+    def load(self, symbol):
+        """Returns (dates, prices) of a stored symbol, empty if not stored."""
+        try:
+            with np.load(self._path(symbol)) as data:
+                return data["dates"], data["prices"]
+        except FileNotFoundError:
+            return np.array([], dtype="datetime64[D]"), np.array([], dtype=float)
+
+    def last_date(self, symbol):
+        dates, _ = self.load(symbol)
+        return dates[-1] if len(dates) else None
+
+    def save(self, symbol, dates, prices):
+        path = self._path(symbol)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, dates=dates, prices=prices)
+        os.replace(tmp_path, path)
+
+    def update(self, symbol, source):
+        """
+        Fetches only the dates after the last stored one and appends them.
+
+        Returns:
+            The number of new rows.
+        """
+        dates, prices = self.load(symbol)
+        start = dates[-1] + np.timedelta64(1, "D") if len(dates) else None
+        new_dates, new_prices = source.fetch(symbol, start)
+        if start is not None:
+            # sources may return rows before start, keep the stored ones
+            keep = new_dates >= start
+            new_dates, new_prices = new_dates[keep], new_prices[keep]
+        if len(new_dates) == 0:
+            return 0
+        self.save(
+            symbol,
+            np.concatenate([dates, new_dates]),
+            np.concatenate([prices, new_prices]),
+        )
+        return len(new_dates)
+
+
+def ingest(symbols, source, store, max_workers=8):
+    """
+    Updates the store for every symbol on a thread pool; max_workers bounds the
+    number of concurrent connections to the source.
+
+    Returns:
+        failures: A dict mapping the symbols that failed to their exceptions.
+    """
+    failures = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(store.update, symbol, source): symbol for symbol in symbols
+        }
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                future.result()
+            except Exception as exc:
+                failures[symbol] = exc
+                print(f"{symbol} failed: {exc!r}", file=sys.stderr)
+    return failures
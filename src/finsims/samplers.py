@@ -0,0 +1,116 @@
+import numpy as np
+from scipy.special import ndtri
+from scipy.stats import qmc
+
+SAMPLERS = ("pseudo", "antithetic", "sobol", "moment_matching")
+
+
+def brownian_bridge(Z):
+    """
+    Turns standard normals along the last axis into Brownian increments with
+    unit variance per step, built by Brownian-bridge construction.
+
+    The first normal sets the terminal value, the next ones the midpoints of
+    ever finer intervals. With QMC inputs, the best-distributed leading
+    dimensions then drive most of the path variance.
+    """
+    n = Z.shape[-1]
+    W = np.zeros(Z.shape[:-1] + (n + 1,), dtype=Z.dtype)
+    W[..., n] = np.sqrt(n) * Z[..., 0]
+    k = 1
+    intervals = [(0, n)]
+    while intervals:
+        refined = []
+        for left, right in intervals:
+            if right - left < 2:
+                continue
+            mid = (left + right) // 2
+            w_left = (right - mid) / (right - left)
+            w_right = (mid - left) / (right - left)
+            std = np.sqrt((mid - left) * (right - mid) / (right - left))
+            W[..., mid] = (
+                w_left * W[..., left] + w_right * W[..., right] + std * Z[..., k]
+            )
+            k += 1
+            refined += [(left, mid), (mid, right)]
+        intervals = refined
+    return np.diff(W, axis=-1)
+
+
+def standard_normals(rng, M, shape, sampler="pseudo", dtype=np.float64):
+    """
+    Draws M samples of standard normals of the given shape (the last axis being
+    time) with a variance-reduction sampler.
+
+    Parameters:
+    - rng: numpy Generator.
+    - M: Number of paths.
+    - shape: Shape of each path's normals, e.g. (n,).
+    - sampler: "pseudo", "antithetic" (M must be even; path i + M/2 mirrors
+      path i), "sobol" (scrambled Sobol points with Brownian-bridge
+      construction along the last axis) or "moment_matching" (every
+      coordinate has exactly zero mean and unit variance across paths).
+
+    Returns:
+    - Array of shape (M,) + shape.
+    """
+    shape = tuple(shape)
+    if sampler == "pseudo":
+        return rng.standard_normal(size=(M,) + shape, dtype=dtype)
+    if sampler == "antithetic":
+        if M % 2:
+            raise ValueError(f"Antithetic sampling needs an even M, got {M}")
+        half = rng.standard_normal(size=(M // 2,) + shape, dtype=dtype)
+        return np.concatenate([half, -half])
+    if sampler == "moment_matching":
+        Z = rng.standard_normal(size=(M,) + shape, dtype=dtype)
+        Z -= Z.mean(axis=0)
+        Z /= Z.std(axis=0)
+        return Z
+    if sampler == "sobol":
+        sobol = qmc.Sobol(d=int(np.prod(shape)), scramble=True, seed=rng)
+        # M need not be a power of two here, at the cost of balance properties
+        u = sobol.random(M).reshape((M,) + shape)
+        Z = ndtri(np.clip(u, 1e-12, 1 - 1e-12)).astype(dtype, copy=False)
+        return brownian_bridge(Z)
+    raise ValueError(f"Unknown sampler: {sampler}")
+
+
+def standard_error(values, sampler="pseudo"):
+    """
+    Monte Carlo estimate and standard error of the mean of per-path values
+    (e.g. discounted payoffs at T).
+
+    Antithetic pairs are averaged first, so the error reflects the variance
+    reduction. For sobol, a single scrambled sample gives no honest error; use
+    replicated_standard_error instead.
+
+    Returns:
+    - (mean, standard error)
+    """
+    values = np.asarray(values)
+    if sampler == "antithetic":
+        half = values.shape[0] // 2
+        values = 0.5 * (values[:half] + values[half : 2 * half])
+    return values.mean(axis=0), values.std(axis=0, ddof=1) / np.sqrt(values.shape[0])
+
+
+def replicated_standard_error(simulate, statistic, n_replicates=10, rng=None):
+    """
+    Standard error of a statistic over independent replicates of a simulation,
+    valid for every sampler including randomized QMC.
+
+    Parameters:
+    - simulate: Function taking rng= and returning simulated paths.
+    - statistic: Function mapping the simulated paths to an estimate.
+    - n_replicates: Number of independent replicates.
+    - rng: numpy Generator or seed used to spawn the replicate seeds.
+
+    Returns:
+    - (mean of the replicate estimates, standard error)
+    """
+    rng = np.random.default_rng(rng)
+    estimates = np.array(
+        [statistic(simulate(rng=child)) for child in rng.spawn(n_replicates)]
+    )
+    return estimates.mean(axis=0), estimates.std(axis=0, ddof=1) / np.sqrt(n_replicates)
@@ -0,0 +1,172 @@
+import numpy as np
+from scipy.stats import ks_2samp, kurtosis, skew, wasserstein_distance
+from transformations import log_return
+
+LAGGED_FACTS = ("acf_returns", "acf_abs_returns", "leverage")
+
+
+def _fft_size(n):
+    # zero padding to at least 2n - 1 avoids circular wrap-around
+    return 1 << int(np.ceil(np.log2(2 * n - 1)))
+
+
+def cross_correlation(x, y, max_lag):
+    """
+    Correlations corr(x_t, y_{t+k}) for k = 0..max_lag of every path, via FFT.
+
+    Parameters:
+    - x, y: Arrays of shape (n, M), one path per column.
+    - max_lag: The largest lag.
+
+    Returns:
+    - Array of shape (max_lag + 1, M). As for the sample autocorrelation, the
+      sums over the n - k overlapping steps are divided by n.
+    """
+    # autocorrelations need one transform only; decide before centering
+    # rebinds x and y
+    same = y is x
+    n = x.shape[0]
+    x = x - x.mean(axis=0)
+    size = _fft_size(n)
+    X = np.fft.rfft(x, n=size, axis=0)
+    if same:
+        Y = X
+        scale = n * x.var(axis=0)
+    else:
+        y = y - y.mean(axis=0)
+        Y = np.fft.rfft(y, n=size, axis=0)
+        scale = n * x.std(axis=0) * y.std(axis=0)
+    cov = np.fft.irfft(np.conj(X) * Y, n=size, axis=0)[: max_lag + 1]
+    return cov / np.where(scale > 0, scale, np.nan)
+
+
+def autocorrelation(x, max_lag):
+    """Autocorrelation of lags 0..max_lag of every path (array of shape (n, M))."""
+    return cross_correlation(x, x, max_lag)
+
+
+def stylized_facts(returns, max_lag=20):
+    """
+    Per-path stylized facts of log returns.
+
+    Parameters:
+    - returns: Log returns (array of shape (n, M)).
+    - max_lag: The largest lag of the lagged facts.
+
+    Returns:
+    - A dict of per-path arrays: "skew" and "kurtosis" (excess, heavy tails)
+      of shape (M,); "acf_returns" (absence of linear autocorrelation),
+      "acf_abs_returns" (volatility clustering) and "leverage",
+      corr(r_t, r_{t+k}^2) (the leverage effect), of shape (max_lag, M) for
+      lags 1..max_lag.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    return {
+        "skew": skew(returns, axis=0),
+        "kurtosis": kurtosis(returns, axis=0),
+        "acf_returns": autocorrelation(returns, max_lag)[1:],
+        "acf_abs_returns": autocorrelation(np.abs(returns), max_lag)[1:],
+        "leverage": cross_correlation(returns, returns**2, max_lag)[1:],
+    }
+
+
+def _as_blocks(data):
+    return [data] if isinstance(data, np.ndarray) else data
+
+
+def _reservoir_update(sample, keys, values, size, rng):
+    # uniform sample without replacement of everything seen so far: keep the
+    # values with the size smallest random keys
+    sample = np.concatenate([sample, values])
+    keys = np.concatenate([keys, rng.random(values.size)])
+    if keys.size > size:
+        keep = np.argpartition(keys, size)[:size]
+        sample, keys = sample[keep], keys[keep]
+    return sample, keys
+
+
+def collect_stylized_facts(
+    blocks, max_lag=20, prices=False, max_returns=1_000_000, rng=None
+):
+    """
+    Computes the stylized facts of streamed blocks of paths.
+
+    Parameters:
+    - blocks: An (n, M) array or an iterable of (n, width) blocks, e.g.
+      simulate_gbm_chunks or the shards of a sharded dataset.
+    - max_lag: The largest lag of the lagged facts.
+    - prices: The blocks hold prices rather than log returns.
+    - max_returns: The size of the uniform sample of the pooled returns kept
+      for comparing the return distributions.
+    - rng: numpy Generator or seed for the return sample.
+
+    Returns:
+    - The stylized_facts dict over all paths, plus "returns": the sample of
+      pooled returns standardized per path.
+    """
+    rng = np.random.default_rng(rng)
+    facts = {}
+    sample, keys = np.empty(0), np.empty(0)
+    for block in _as_blocks(blocks):
+        returns = log_return(block) if prices else np.asarray(block, np.float64)
+        for name, values in stylized_facts(returns, max_lag).items():
+            facts.setdefault(name, []).append(values)
+        standardized = (returns - returns.mean(axis=0)) / returns.std(axis=0)
+        sample, keys = _reservoir_update(
+            sample, keys, standardized.ravel(), max_returns, rng
+        )
+    facts = {name: np.concatenate(values, axis=-1) for name, values in facts.items()}
+    facts["returns"] = sample
+    return facts
+
+
+def summarize(facts):
+    """Means over the paths of every stylized fact, ignoring undefined values."""
+    return {
+        name: np.nanmean(values, axis=-1)
+        for name, values in facts.items()
+        if name != "returns"
+    }
+
+
+def _distances(u, v):
+    u, v = u[np.isfinite(u)], v[np.isfinite(v)]
+    return wasserstein_distance(u, v), ks_2samp(u, v).statistic
+
+
+def compare_stylized_facts(real, generated, max_lag=20, prices=False, rng=None):
+    """
+    Wasserstein and KS distances between the stylized facts of real and
+    generated paths.
+
+    Parameters:
+    - real, generated: Arrays of shape (n, M) or iterables of blocks (see
+      collect_stylized_facts); the two sets may differ in n and M.
+    - max_lag: The largest lag of the lagged facts.
+    - prices: The inputs hold prices rather than log returns.
+    - rng: numpy Generator or seed for the return samples.
+
+    Returns:
+    - A dict mapping "returns" (the pooled standardized returns), "skew",
+      "kurtosis" and the lagged facts to {"wasserstein": ..., "ks": ...}
+      between the distributions of the per-path values; the lagged facts give
+      arrays over lags 1..max_lag.
+    """
+    rng = np.random.default_rng(rng)
+    real_facts = collect_stylized_facts(real, max_lag, prices, rng=rng)
+    generated_facts = collect_stylized_facts(generated, max_lag, prices, rng=rng)
+    comparison = {}
+    for name, real_values in real_facts.items():
+        generated_values = generated_facts[name]
+        if name in LAGGED_FACTS:
+            distances = np.array(
+                [_distances(r, g) for r, g in zip(real_values, generated_values)]
+            )
+            comparison[name] = {
+                "wasserstein": distances[:, 0],
+                "ks": distances[:, 1],
+            }
+        else:
+            wasserstein, ks = _distances(real_values, generated_values)
+            comparison[name] = {"wasserstein": wasserstein, "ks": ks}
+    return comparison
@@ -0,0 +1,56 @@
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+
+def spawn_seeds(seed, n_jobs):
+    """
+    Derive one independent child SeedSequence per job from a parent seed.
+
+    The children depend only on the parent seed and the job index, so a sweep
+    produces the same datasets whether it runs serially or on a process pool.
+    """
+    return np.random.SeedSequence(seed).spawn(n_jobs)
+
+
+def seed_to_dict(seed_seq):
+    return {"entropy": seed_seq.entropy, "spawn_key": list(seed_seq.spawn_key)}
+
+
+def run_sweep(job, jobs, workers=1, results=None):
+    """
+    Run job(*args) for every (name, args) pair in jobs.
+
+    Args:
+        job: A module-level (picklable) function.
+        jobs: A list of (name, args) tuples.
+        workers: Number of worker processes; 1 runs the jobs in this process.
+        results: An optional dict that receives the return value of each job.
+
+    Returns:
+        failures: A dict mapping the names of failed jobs to their exceptions.
+    """
+    failures = {}
+    results = {} if results is None else results
+    if workers <= 1:
+        for name, args in jobs:
+            try:
+                results[name] = job(*args)
+            except Exception as exc:
+                failures[name] = exc
+                print(f"{name} failed: {exc!r}", file=sys.stderr)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(job, *args): name for name, args in jobs}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    results[name] = future.result()
+                except Exception as exc:
+                    failures[name] = exc
+                    print(f"{name} failed: {exc!r}", file=sys.stderr)
+
+    if failures:
+        print(f"{len(failures)} of {len(jobs)} jobs failed", file=sys.stderr)
+    return failures
@@ -1,18 +1,21 @@
 import numpy as np
 from scipy.fftpack import dct, idct
+from wavelet_transformations import wavelet_inverse_transform_batch
 
 
 def log_return(series):
     return np.diff(np.log(series), axis=0)
 
 
-def reverse_log_returns(log_returns, s0):
+def reverse_log_returns(log_returns, s0, out=None, dtype=np.float64):
     """
     Reconstructs the price series from log returns.
 
     Parameters:
     - log_returns: The log returns series (2D array).
     - s0: The initial price (float or array).
+    - out: Optional preallocated array of shape (n+1, M) for the prices.
+    - dtype: The dtype of the prices when out is not given.
 
     Returns:
     - Reconstructed price series.
@@ -20,18 +23,16 @@ def reverse_log_returns(log_returns, s0):
     # Initialize the price array
     M = log_returns.shape[1]  # Number of paths
     n = log_returns.shape[0] + 1  # Number of time steps, including the initial price
-    reconstructed_prices = np.zeros((n, M))
+    if out is None:
+        out = np.empty((n, M), dtype=dtype)
 
-    # Set the initial prices
-    reconstructed_prices[0, :] = s0
+    # Rebuild prices as s0 * exp(cumulative log returns)
+    out[0] = 1
+    np.cumsum(log_returns, axis=0, dtype=out.dtype, out=out[1:])
+    np.exp(out[1:], out=out[1:])
+    out *= s0
 
-    # Rebuild prices from log returns
-    for i in range(1, n):
-        reconstructed_prices[i, :] = reconstructed_prices[i - 1, :] * np.exp(
-            log_returns[i - 1, :]
-        )
-
-    return reconstructed_prices
+    return out
 
 
 def cosine_transform(series):
@@ -40,3 +41,46 @@ def cosine_transform(series):
 
 def inverse_cosine_transform(series):
     return idct(series, norm="ortho", axis=0)
+
+
+def decode_cosine(coeffs, mean=0.0, std=1.0, s0=None, overwrite=False):
+    """
+    Decodes (optionally z-scored) cosine coefficients back to prices.
+
+    Parameters:
+    - coeffs: Cosine coefficients (2D array of shape (n, M)).
+    - mean, std: The z-score parameters used to normalize the coefficients.
+    - s0: If given, the coefficients are of log returns and are integrated
+      into prices starting at s0.
+    - overwrite: Reuse the coefficient array as the working buffer.
+
+    Returns:
+    - Decoded price series.
+    """
+    series = coeffs if overwrite else coeffs.copy()
+    series *= std
+    series += mean
+    series = idct(series, norm="ortho", axis=0, overwrite_x=True)
+    if s0 is None:
+        return series
+    return reverse_log_returns(series, s0, dtype=series.dtype)
+
+
+def decode_wavelet(coeffs, coeff_lengths, wavelet_name, s0=None):
+    """
+    Decodes concatenated wavelet coefficients back to prices.
+
+    Parameters:
+    - coeffs: Concatenated wavelet coefficients (2D array, one column per path).
+    - coeff_lengths: The length of every decomposition level.
+    - wavelet_name: The name of the wavelet used for decomposition.
+    - s0: If given, the coefficients are of log returns and are integrated
+      into prices starting at s0.
+
+    Returns:
+    - Decoded price series.
+    """
+    series = wavelet_inverse_transform_batch(coeffs, coeff_lengths, wavelet_name)
+    if s0 is None:
+        return series
+    return reverse_log_returns(series, s0, dtype=series.dtype)
@@ -1,41 +1,87 @@
+import json
+
 import numpy as np
 import pywt
 
 
-def wavelet_transform(data, wavelet_name):
+def wavelet_transform_batch(data, wavelet_name):
     """
-    Applies wavelet decomposition to each time series in the data array.
+    Applies wavelet decomposition to all time series at once along axis 0.
+
     Args:
         data: A 2D numpy array of shape (n, M) where n is the number
          of timesteps and M is the number of time series.
         wavelet_name: The name of the wavelet to use for decomposition.
 
     Returns:
-        concatenated_coeffs_list: A list of concatenated wavelet coefficients for each time series.
-        coeff_shapes_list: A list of coefficient shapes for each time series.
-        coeffs_list: A list of original coefficients for each time series.
+        coeffs: A 2D numpy array of concatenated coefficients, one column per series.
+        coeff_lengths: The length of every decomposition level, shared by all series.
+    """
+    coeffs = pywt.wavedec(data, wavelet_name, axis=0)
+    coeff_lengths = [c.shape[0] for c in coeffs]
+    return np.concatenate(coeffs, axis=0), coeff_lengths
+
+
+def split_coeffs(coeffs, coeff_lengths):
+    """
+    Splits a concatenated coefficient matrix back into one view per level.
+
+    Args:
+        coeffs: A 2D numpy array of concatenated coefficients, one column per series.
+        coeff_lengths: The length of every decomposition level.
+
+    Returns:
+        A list of 2D views of shape (coeff_lengths[k], M).
     """
-    concatenated_coeffs_list = []
-    coeff_shapes_list = []
-    coeffs_list = []
+    offsets = np.cumsum(coeff_lengths)[:-1]
+    return np.split(coeffs, offsets, axis=0)
 
-    # Loop through each time series (column in the data)
-    for i in range(data.shape[1]):
-        # Perform wavelet decomposition on the i-th time series
-        coeffs = pywt.wavedec(data[:, i], wavelet_name)
 
-        # Store the shape of each coefficient array for restoration later
-        coeff_shapes = [c.shape for c in coeffs]
+def wavelet_inverse_transform_batch(coeffs, coeff_lengths, wavelet_name):
+    """
+    Reconstructs all time series from a concatenated coefficient matrix.
 
-        # Concatenate coefficients into a single array
-        concatenated_coeffs = np.concatenate([c.ravel() for c in coeffs])
+    Args:
+        coeffs: A 2D numpy array of concatenated coefficients, one column per series.
+        coeff_lengths: The length of every decomposition level.
+        wavelet_name: The name of the wavelet used for reconstruction.
 
-        # Append results to the lists
-        concatenated_coeffs_list.append(concatenated_coeffs)
-        coeff_shapes_list.append(coeff_shapes)
-        coeffs_list.append(coeffs)
+    Returns:
+        restored_data: A 2D numpy array of shape (n, M).
+    """
+    return pywt.waverec(split_coeffs(coeffs, coeff_lengths), wavelet_name, axis=0)
 
-    return np.array(concatenated_coeffs_list).T, np.array(coeff_shapes_list)
+
+def load_wavelet_params(params_path):
+    """
+    Reads a {wavelet}-...-params.json sidecar written by the dataset drivers.
+
+    Returns:
+        coeff_lengths: The length of every decomposition level.
+        wavelet_name: The name of the wavelet.
+    """
+    with open(params_path, "r") as f:
+        params = json.load(f)
+    return [int(length) for length in params["coeffs_shapes"]], params["wavelet_name"]
+
+
+def wavelet_transform(data, wavelet_name):
+    """
+    Applies wavelet decomposition to each time series in the data array.
+    Args:
+        data: A 2D numpy array of shape (n, M) where n is the number
+         of timesteps and M is the number of time series.
+        wavelet_name: The name of the wavelet to use for decomposition.
+
+    Returns:
+        concatenated_coeffs: A 2D numpy array of concatenated wavelet coefficients,
+         one column per time series.
+        coeff_shapes_list: The coefficient shapes of each time series (identical
+         for all series, broadcast to shape (M, levels, 1)).
+    """
+    coeffs, coeff_lengths = wavelet_transform_batch(data, wavelet_name)
+    coeff_shapes = np.array(coeff_lengths)[:, None]
+    return coeffs, np.broadcast_to(coeff_shapes, (data.shape[1],) + coeff_shapes.shape)
 
 
 def restore_coeffs(concatenated_coeffs_list, coeff_shapes):
@@ -49,24 +95,9 @@ def restore_coeffs(concatenated_coeffs_list, coeff_shapes):
     Returns:
         restored_coeffs_list: A list of restored wavelet coefficients for each time series.
     """
-    restored_coeffs_list = []
-
-    # Loop through each time series
-    for concatenated_coeffs in concatenated_coeffs_list.T:
-        restored_coeffs = []
-        start = 0
-
-        # Reshape the concatenated array back to the original coefficient shapes
-        for shape in coeff_shapes:
-            size = np.prod(shape)  # Total number of elements in the coefficient
-            restored_coeffs.append(
-                concatenated_coeffs[start : start + size].reshape(shape)
-            )
-            start += size
-
-        restored_coeffs_list.append(restored_coeffs)
-
-    return restored_coeffs_list
+    coeff_lengths = [int(np.prod(shape)) for shape in coeff_shapes]
+    levels = split_coeffs(np.asarray(concatenated_coeffs_list), coeff_lengths)
+    return [[level[:, i] for level in levels] for i in range(levels[0].shape[1])]
 
 
 def wavelet_inverse_transform(restored_coeffs_list, wavelet_name):
@@ -81,15 +112,5 @@ def wavelet_inverse_transform(restored_coeffs_list, wavelet_name):
         restored_data: A 2D numpy array of shape (n, M) where n is
          the number of timesteps and M is the number of time series.
     """
-    restored_data_list = []
-
-    # Loop through each time series' restored coefficients
-    for restored_coeffs in restored_coeffs_list:
-        # Perform inverse wavelet transform to reconstruct the time series
-        restored_data = pywt.waverec(restored_coeffs, wavelet_name)
-        restored_data_list.append(restored_data)
-
-    # Stack the restored data columns into a 2D array (n, M)
-    restored_data_array = np.column_stack(restored_data_list)
-
-    return np.array(restored_data_array)
+    levels = [np.column_stack(level) for level in zip(*restored_coeffs_list)]
+    return pywt.waverec(levels, wavelet_name, axis=0)
@@ -0,0 +1,134 @@
+import os
+
+import numpy as np
+from jsonl_utils import read_shard_manifest
+
+
+class WindowedDataset:
+    """
+    Serves windows of length window of the paths of a dataset saved by
+    save_dataset in the npy or sharded format.
+
+    The files are memory-mapped read-only, so windows are zero-copy views and
+    several data-loader workers share one on-disk dataset through the page
+    cache instead of each holding a copy. The maps are opened lazily and are
+    not pickled, so every worker process opens its own.
+
+    Windows are addressed as (path, start) pairs. Strided windows start at
+    0, stride, 2 * stride, ... of every path and are numbered path-major by
+    __getitem__; random windows may start at any step.
+
+    Args:
+        filename: The dataset name without extension, as passed to save_dataset.
+        format_: "npy" or "sharded".
+        window: The window length in time steps.
+        stride: The step between strided windows (defaults to window, i.e.
+         non-overlapping windows).
+    """
+
+    def __init__(self, filename, format_="npy", window=390, stride=None):
+        if format_ not in ("npy", "sharded"):
+            raise ValueError(f"Cannot memory-map the {format_} format")
+        self.filename = filename
+        self.format_ = format_
+        self.window = window
+        self.stride = window if stride is None else stride
+        self._arrays = None
+        arrays, _ = self._open()
+        self.n = arrays[0].shape[0]
+        self.M = sum(array.shape[1] for array in arrays)
+        self.dtype = arrays[0].dtype
+        if self.n < window:
+            raise ValueError(f"Windows of {window} steps exceed the {self.n} steps")
+        self.windows_per_path = (self.n - window) // self.stride + 1
+
+    def _open(self):
+        if self._arrays is None:
+            if self.format_ == "npy":
+                arrays = [np.load(f"{self.filename}.npy", mmap_mode="r")]
+            else:
+                manifest = read_shard_manifest(self.filename)
+                arrays = [
+                    np.load(os.path.join(self.filename, shard["file"]), mmap_mode="r")
+                    for shard in manifest["shards"]
+                ]
+            # first path of every array, to locate the array holding a path
+            starts = np.cumsum([0] + [array.shape[1] for array in arrays[:-1]])
+            self._arrays = arrays, starts
+        return self._arrays
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_arrays"] = None
+        return state
+
+    def __len__(self):
+        return self.M * self.windows_per_path
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError(f"Window {index} out of range")
+        path, k = divmod(index % len(self), self.windows_per_path)
+        return self.view(path, k * self.stride)
+
+    def view(self, path, start):
+        """Returns the window of path starting at start as a read-only view."""
+        arrays, starts = self._open()
+        shard = np.searchsorted(starts, path, side="right") - 1
+        return arrays[shard][start : start + self.window, path - starts[shard]]
+
+    def random_windows(self, size, rng=None):
+        """Draws size (path, start) pairs uniformly over all windows."""
+        rng = np.random.default_rng(rng)
+        paths = rng.integers(0, self.M, size=size)
+        starts = rng.integers(0, self.n - self.window + 1, size=size)
+        return np.stack([paths, starts], axis=1)
+
+    def strided_windows(self, indices):
+        """Converts strided window indices to (path, start) pairs."""
+        paths, k = np.divmod(np.asarray(indices), self.windows_per_path)
+        return np.stack([paths, k * self.stride], axis=1)
+
+    def gather(self, windows, out=None):
+        """
+        Copies the windows given as (path, start) pairs into out.
+
+        Args:
+            windows: An array of shape (batch, 2).
+            out: An optional reusable buffer of shape (batch, window).
+
+        Returns:
+            out: The batch of windows (array of shape (batch, window)).
+        """
+        windows = np.asarray(windows)
+        if out is None:
+            out = np.empty((len(windows), self.window), dtype=self.dtype)
+        arrays, starts = self._open()
+        paths = windows[:, 0]
+        shards = np.searchsorted(starts, paths, side="right") - 1
+        steps = np.arange(self.window)
+        # one fancy-indexed copy of all windows held by the same array
+        for shard in np.unique(shards):
+            rows = np.flatnonzero(shards == shard)
+            out[rows] = arrays[shard][
+                windows[rows, 1, np.newaxis] + steps,
+                paths[rows, np.newaxis] - starts[shard],
+            ]
+        return out
+
+    def batches(self, batch_size=64, shuffle=True, rng=None, drop_last=False):
+        """
+        Iterates once over all strided windows in batches.
+
+        The batches are gathered into one reused buffer, so every yielded
+        array is overwritten by the next batch; copy it to keep it.
+        """
+        order = np.arange(len(self))
+        if shuffle:
+            np.random.default_rng(rng).shuffle(order)
+        buffer = np.empty((batch_size, self.window), dtype=self.dtype)
+        for begin in range(0, len(order), batch_size):
+            indices = order[begin : begin + batch_size]
+            if len(indices) < batch_size and drop_last:
+                break
+            yield self.gather(self.strided_windows(indices), buffer[: len(indices)])